@@ -0,0 +1,168 @@
+import re
+import numpy as np
+from datetime import date
+
+# Vectorized statistics over dense, day-indexed arrays.
+# A series covers the inclusive ordinal range [start, end] (date.toordinal()),
+# with slot i holding the value for day start + i.
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def _rows_to_array(rows):
+    # (day, value) rows -> float array of shape (n, 2); NULL values become NaN
+    rows = list(rows)
+    if not rows:
+        return np.empty((0, 2))
+    return np.array(rows, dtype=np.float64).reshape(-1, 2)
+
+def habit_series(rows, start, end):
+    # Returns (done, logged) boolean arrays; logged tells "No" apart from unset
+    data = _rows_to_array(rows)
+    size = end - start + 1
+    done = np.zeros(size, dtype=bool)
+    logged = np.zeros(size, dtype=bool)
+    offsets = data[:, 0].astype(np.int64) - start
+    inside = (offsets >= 0) & (offsets < size)
+    logged[offsets[inside]] = True
+    done[offsets[inside]] = data[inside, 1] == 1
+    return done, logged
+
+def measurable_series(rows, start, end):
+    # Float array with NaN on days that have no log
+    data = _rows_to_array(rows)
+    size = end - start + 1
+    values = np.full(size, np.nan)
+    offsets = data[:, 0].astype(np.int64) - start
+    inside = (offsets >= 0) & (offsets < size)
+    values[offsets[inside]] = data[inside, 1]
+    return values
+
+def run_lengths(mask):
+    # Lengths of every run of True, in order
+    padded = np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    return edges[1::2] - edges[::2]
+
+def longest_run(mask):
+    runs = run_lengths(mask)
+    return int(runs.max()) if runs.size else 0
+
+def completion_rate(done, logged):
+    total = int(np.count_nonzero(logged))
+    if not total:
+        return 0
+    return round(int(np.count_nonzero(done & logged)) / total * 100, 2)
+
+def rolling_mean(values, window):
+    # Trailing mean over `window` days, ignoring NaN; NaN where the window is empty
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    sums = np.cumsum(np.where(present, values, 0.0))
+    counts = np.cumsum(present)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+def value_summary(values):
+    # Mean/min/max over logged, positive values (matches the visual pages)
+    values = np.asarray(values, dtype=np.float64)
+    valid = values[~np.isnan(values) & (values > 0)]
+    if not valid.size:
+        return {'count': 0, 'avg': 0, 'highest': 0, 'lowest': 0}
+    return {
+        'count': int(valid.size),
+        'avg': round(float(valid.mean()), 2),
+        'highest': float(valid.max()),
+        'lowest': float(valid.min())
+    }
+
+def percentiles(values, qs=(10, 25, 50, 75, 90)):
+    # Over logged, positive values like value_summary; None when there are none
+    values = np.asarray(values, dtype=np.float64)
+    valid = values[~np.isnan(values) & (values > 0)]
+    if not valid.size:
+        return None
+    return {f'p{q}': round(float(v), 2) for q, v in zip(qs, np.percentile(valid, qs))}
+
+def parse_target(unit_target):
+    # "50", "7.5 hours", "30 min" -> the first number, or None
+    match = re.search(r'\d+(?:\.\d+)?', unit_target or '')
+    return float(match.group()) if match else None
+
+def target_attainment(values, target, target_type):
+    # Share of logged days (zeros included) at or above the target, or at or below it for "Atmost"
+    values = np.asarray(values, dtype=np.float64)
+    logged = values[~np.isnan(values)]
+    if target is None:
+        return None
+    if (target_type or '').lower() == 'atmost':
+        met = int(np.count_nonzero(logged <= target))
+    else:
+        met = int(np.count_nonzero(logged >= target))
+    return {'target': target, 'met': met, 'days': int(logged.size),
+            'rate': round(met / logged.size * 100, 2) if logged.size else 0}
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: indices of at most `threshold` points that
+    # keep the shape of the (x, y) line. The first and last points always stay.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = x.size
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < threshold - 1:
+            following = slice(edges[bucket + 1], edges[bucket + 2])
+        else:
+            following = slice(size - 1, size)
+        next_x, next_y = x[following].mean(), y[following].mean()
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's mean
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+def chart_points(values, max_points):
+    # Slots to plot: every day of a short series, otherwise the logged days LTTB keeps
+    values = np.asarray(values, dtype=np.float64)
+    if values.size <= max_points:
+        return np.arange(values.size)
+    logged = np.flatnonzero(~np.isnan(values))
+    return logged[lttb(logged, values[logged], max_points)]
+
+def to_chart(values, digits=2, fill=None):
+    # JSON-friendly list; NaN becomes `fill` (None leaves a gap in the chart)
+    return [fill if np.isnan(v) else round(float(v), digits) for v in np.asarray(values, dtype=np.float64)]
+
+def _dates(start, size):
+    # datetime64[D] for each slot; ordinal 1 is 0001-01-01
+    return np.datetime64('0001-01-01') + np.arange(start - 1, start - 1 + size).astype('timedelta64[D]')
+
+def month_breakdown(start, values):
+    # Per calendar month: (list of month start dates, sums, counts of non-NaN, non-zero values)
+    values = np.asarray(values, dtype=np.float64)
+    if not values.size:
+        return [], np.empty(0), np.empty(0, dtype=np.int64)
+    months = _dates(start, values.size).astype('datetime64[M]')
+    index = (months - months[0]).astype(np.int64)
+    present = ~np.isnan(values) & (values != 0)
+    sums = np.bincount(index, weights=np.where(present, values, 0.0))
+    counts = np.bincount(index, weights=present).astype(np.int64)
+    labels = [date.fromisoformat(str(m) + '-01') for m in np.arange(months[0], months[-1] + 1)]
+    return labels, sums, counts
+
+def weekday_breakdown(start, mask, logged=None):
+    # Per weekday (Mon..Sun): (count of True days, count of logged days or of all days)
+    mask = np.asarray(mask, dtype=bool)
+    weekdays = (np.arange(start, start + mask.size) - 1) % 7
+    hits = np.bincount(weekdays[mask], minlength=7)
+    totals = np.bincount(weekdays if logged is None else weekdays[np.asarray(logged, dtype=bool)], minlength=7)
+    return hits, totals
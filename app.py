@@ -1,75 +1,849 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import (Blueprint, Flask, Response, render_template, request, redirect, url_for, session, flash,
+                   jsonify, abort, current_app, g, has_request_context, make_response, send_file, stream_template,
+                   stream_with_context, before_render_template, template_rendered)
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from markupsafe import escape
 from datetime import datetime, date
+from collections import OrderedDict, defaultdict
+from bitmap_cache import BitmapCache
+from definition_cache import DefinitionCache, Definitions
+from export_formats import (ARROW_AVAILABLE, COMPRESSION, ZSTD_AVAILABLE, iter_arrow, iter_compressed,
+                            iter_csv)
+from export_jobs import ExportJobs, QueueFull
+from importer import READERS, ImportFormatError, detect_format
+from models import (db, User, Habit, Measurable, HabitLog, MeasurableLog, Journal, HabitStreak, HabitMonthRollup,
+                    MeasurableMonthRollup, HabitStats, MeasurableStats, StatsCheckpoint)
+from password_hasher import PasswordHasher, HasherBusy
+import analytics
+import stats_job
+import models
+import metrics
 import calendar
-import json
+import functools
+import click
+import hashlib
 import io
+import json
+import itertools
+import math
+import os
+import tempfile
+import threading
+import time
 
 # Excel export dependencies
 try:
     import openpyxl
     from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
     EXCEL_AVAILABLE = True
 except ImportError:
     EXCEL_AVAILABLE = False
     print("openpyxl not available. Install with: pip install openpyxl")
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-
-# ------------------ Models ------------------
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-
-class Habit(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    type = db.Column(db.String(50), nullable=False)
-    name = db.Column(db.String(100), nullable=False)
-    question = db.Column(db.String(255))
-    notes = db.Column(db.Text)
-    color = db.Column(db.String(20))
-
-class Measurable(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    name = db.Column(db.String(100), nullable=False)
-    question = db.Column(db.String(255))
-    unit_target = db.Column(db.String(50), nullable=False)
-    target_type = db.Column(db.String(20), nullable=False)  # Atleast or Atmost
-    notes = db.Column(db.Text)
-    color = db.Column(db.String(20))
-
-class HabitLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), nullable=False)
-    date = db.Column(db.String(10), nullable=False)  # 'YYYY-MM-DD'
-    value = db.Column(db.Boolean)
-
-class MeasurableLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    measurable_id = db.Column(db.Integer, db.ForeignKey('measurable.id'), nullable=False)
-    date = db.Column(db.String(10), nullable=False)
-    value = db.Column(db.Float)
-
-class Journal(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    date = db.Column(db.String(10), nullable=False)  # Format: YYYY-MM-DD
-    content = db.Column(db.Text, nullable=True)
+# ------------------ App Factory ------------------
+# Defaults; any key can be overridden from the environment as FLASK_<KEY>
+# (values are parsed as JSON, e.g. FLASK_DB_POOL_SIZE=10) or by passing a
+# mapping to create_app().
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'your-secret-key',
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///users.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    # Apply pending schema migrations in create_app(). Deployments that start
+    # several workers at once can turn this off and run `flask init-db` first.
+    'DB_AUTO_MIGRATE': True,
+    # Connection pools; DB_READ_POOL_SIZE = 0 keeps read-only views on the main pool
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_READ_POOL_SIZE': 5,
+    # Applied to every new SQLite connection
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_CACHE_SIZE_KB': 64 * 1024,
+    # Password hashing: werkzeug method string ("scrypt", "pbkdf2:sha256:600000", ...);
+    # stored hashes made with other parameters are upgraded on the next login
+    'PASSWORD_HASH_METHOD': 'scrypt',
+    'PASSWORD_HASH_BACKEND': 'process',  # or "inline"
+    'PASSWORD_HASH_WORKERS': 2,
+    'PASSWORD_HASH_MAX_PENDING': 16,
+    # Background exports
+    'EXPORT_JOB_WORKERS': 2,
+    'EXPORT_JOB_MAX_PENDING': 8,
+    'EXPORT_JOB_TTL': 60 * 60,
+    # Instrumentation; SQL_REPEAT_THRESHOLD > 0 logs statements run that many
+    # times within one request (likely N+1 loops)
+    'SERVER_TIMING': True,
+    'METRICS_ENABLED': True,
+    'SQL_REPEAT_THRESHOLD': 0,
+}
+
+bp = Blueprint('main', __name__, cli_group=None)
+
+def read_only(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+def configure_sqlite(engine, config, read_only=False):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # Persistent in the database file, so only the writer sets it
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.execute(f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
+
+    # In-memory SQLite runs on a single static connection, so pool sizing does not apply
+    in_memory = app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:')
+    if not in_memory:
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+            'pool_size': app.config['DB_POOL_SIZE'],
+            'max_overflow': app.config['DB_MAX_OVERFLOW'],
+            'pool_timeout': app.config['DB_POOL_TIMEOUT']
+        })
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config)
+        instrument_engine(db.engine)
+        if app.config['DB_READ_POOL_SIZE'] and not in_memory:
+            read_engine = create_engine(db.engine.url, pool_size=app.config['DB_READ_POOL_SIZE'],
+                                        max_overflow=0, pool_timeout=app.config['DB_POOL_TIMEOUT'])
+            configure_sqlite(read_engine, app.config, read_only=True)
+            instrument_engine(read_engine)
+            app.extensions['read_engine'] = read_engine
+        if app.config['DB_AUTO_MIGRATE']:
+            init_db()
+
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        backend=app.config['PASSWORD_HASH_BACKEND'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING']
+    )
+    app.extensions['export_jobs'] = ExportJobs(
+        os.path.join(app.instance_path, 'exports'),
+        max_workers=app.config['EXPORT_JOB_WORKERS'],
+        max_pending=app.config['EXPORT_JOB_MAX_PENDING'],
+        ttl=app.config['EXPORT_JOB_TTL']
+    )
+    app.register_blueprint(bp)
+    return app
+
+def __getattr__(name):
+    # `gunicorn app:app` and `from app import app` get an application built
+    # from the defaults and FLASK_* environment on first access; callers that
+    # need their own config use `app:create_app()` or create_app(config).
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ------------------ Dates ------------------
+# Log tables keep the 'YYYY-MM-DD' string for the API and store the
+# proleptic Gregorian ordinal (date.toordinal()) in `day` for indexed ranges.
+def parse_day(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').date()
+
+def day_ordinal(date_str):
+    return parse_day(date_str).toordinal()
+
+def month_bounds(year, month):
+    days_in_month = calendar.monthrange(year, month)[1]
+    return date(year, month, 1).toordinal(), date(year, month, days_in_month).toordinal()
+
+def year_bounds(year):
+    return date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+
+ROLLING_WINDOWS = (7, 30)
+CHART_MAX_POINTS = 1000  # longer daily series are downsampled with LTTB
+
+def week_bounds(today):
+    # Week starts on Sunday
+    start = today.toordinal() - (today.weekday() + 1) % 7
+    return start, start + 6
+
+def quarter_bounds(today):
+    first_month = (today.month - 1) // 3 * 3 + 1
+    return month_bounds(today.year, first_month)[0], month_bounds(today.year, first_month + 2)[1]
+
+# ------------------ Schema Migrations ------------------
+# Steps run once each, in order, on databases created before they existed.
+# Progress is tracked in SQLite's PRAGMA user_version.
+def _migrate_unique_log_indexes():
+    # Keep the newest row of every duplicated key before enforcing uniqueness
+    for table, owner in (('habit_log', 'habit_id'), ('measurable_log', 'measurable_id'), ('journal', 'user_id')):
+        db.session.execute(db.text(
+            f"DELETE FROM {table} WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY {owner}, date)"
+        ))
+        db.session.execute(db.text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{table}_{owner}_date ON {table} ({owner}, date)"
+        ))
+
+def _canonical_date(value):
+    try:
+        return parse_day(str(value).strip()).isoformat()
+    except ValueError:
+        return None
+
+def _normalize_legacy_dates(table, owner):
+    # Older versions stored whatever date string the routes were given. Rewrite the
+    # ones strptime can read ('2025-7-4') as YYYY-MM-DD, keeping the newest row when
+    # that creates a duplicate, and move the rest to quarantined_rows.
+    rows = db.session.execute(db.text(f"SELECT * FROM {table} WHERE date(date) IS NOT date")).mappings().all()
+    quarantined = 0
+    for row in rows:
+        canonical = _canonical_date(row['date'])
+        if canonical is None:
+            db.session.execute(db.text(
+                "INSERT INTO quarantined_rows (source, row_id, data, reason) VALUES (:source, :row_id, :data, :reason)"
+            ), {'source': table, 'row_id': row['id'], 'data': json.dumps(dict(row)), 'reason': 'unreadable date'})
+            db.session.execute(db.text(f"DELETE FROM {table} WHERE id = :id"), {'id': row['id']})
+            quarantined += 1
+            continue
+        existing = db.session.execute(db.text(f"SELECT id FROM {table} WHERE {owner} = :owner AND date = :date"),
+                                      {'owner': row[owner], 'date': canonical}).scalar()
+        if existing is not None and existing > row['id']:
+            db.session.execute(db.text(f"DELETE FROM {table} WHERE id = :id"), {'id': row['id']})
+            continue
+        if existing is not None:
+            db.session.execute(db.text(f"DELETE FROM {table} WHERE id = :id"), {'id': existing})
+        db.session.execute(db.text(f"UPDATE {table} SET date = :date WHERE id = :id"),
+                           {'date': canonical, 'id': row['id']})
+    if quarantined:
+        print(f"Moved {quarantined} {table} rows with unreadable dates to quarantined_rows")
+
+def _migrate_day_ordinals():
+    # julianday('0001-01-01') is 1721425.5 and date(1, 1, 1).toordinal() is 1
+    db.session.execute(db.text(
+        "CREATE TABLE IF NOT EXISTS quarantined_rows "
+        "(id INTEGER PRIMARY KEY, source TEXT NOT NULL, row_id INTEGER, data TEXT, reason TEXT)"
+    ))
+    for table, owner in (('habit_log', 'habit_id'), ('measurable_log', 'measurable_id'), ('journal', 'user_id')):
+        _normalize_legacy_dates(table, owner)
+        db.session.execute(db.text(f"ALTER TABLE {table} ADD COLUMN day INTEGER NOT NULL DEFAULT 0"))
+        db.session.execute(db.text(f"UPDATE {table} SET day = CAST(julianday(date) - 1721424.5 AS INTEGER)"))
+        db.session.execute(db.text(f"DROP INDEX IF EXISTS ix_{table}_{owner}_date"))
+        db.session.execute(db.text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{table}_{owner}_day ON {table} ({owner}, day)"
+        ))
+
+def _migrate_habit_streaks():
+    recompute_streaks()
+
+def _migrate_month_rollups():
+    rebuild_rollups()
+
+def _migrate_user_data_version():
+    db.session.execute(db.text("ALTER TABLE user ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+
+MIGRATIONS = [
+    _migrate_unique_log_indexes,
+    _migrate_day_ordinals,
+    _migrate_habit_streaks,
+    _migrate_month_rollups,
+    _migrate_user_data_version,
+]
+
+def init_db():
+    fresh = not db.inspect(db.engine).has_table('user')
+    db.create_all()
+    version = len(MIGRATIONS)
+    if not fresh:
+        version = db.session.execute(db.text('PRAGMA user_version')).scalar()
+        for step in MIGRATIONS[version:]:
+            step()
+            db.session.commit()
+            version += 1
+            print(f"Applied migration {version}: {step.__name__}")
+    db.session.execute(db.text(f'PRAGMA user_version = {version}'))
+    db.session.commit()
+    create_journal_search()
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and apply pending schema migrations."""
+    init_db()
+    print("Database is up to date")
+
+# ------------------ Journal Search ------------------
+# journal_fts is an external-content FTS5 index over journal.content, kept in
+# sync by triggers, so upserts from save_journal need no extra work. SQLite
+# builds without FTS5 fall back to a LIKE scan.
+JOURNAL_FTS_SQL = [
+    """CREATE VIRTUAL TABLE journal_fts USING fts5(
+        content, content='journal', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER journal_fts_insert AFTER INSERT ON journal BEGIN
+        INSERT INTO journal_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER journal_fts_delete AFTER DELETE ON journal BEGIN
+        INSERT INTO journal_fts (journal_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER journal_fts_update AFTER UPDATE OF content ON journal BEGIN
+        INSERT INTO journal_fts (journal_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO journal_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+    "INSERT INTO journal_fts (journal_fts) VALUES ('rebuild')",
+]
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+# Snippet markers that cannot appear in escaped HTML; swapped for <mark> after escaping
+SNIPPET_OPEN, SNIPPET_CLOSE = '\x02', '\x03'
+
+def journal_search_available():
+    # Kept per app, since every app may run on its own database
+    available = current_app.extensions.get('journal_search')
+    if available is None:
+        available = current_app.extensions['journal_search'] = db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_fts'"
+        )).first() is not None
+    return available
+
+def create_journal_search():
+    if journal_search_available():
+        return
+    try:
+        for statement in JOURNAL_FTS_SQL:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+        current_app.extensions['journal_search'] = True
+    except OperationalError as e:
+        db.session.rollback()
+        current_app.extensions['journal_search'] = False
+        print(f"Journal full-text search not available: {e}")
+
+def fts_query(text):
+    # Every word must match; the last one as a prefix so results follow typing
+    words = [w.replace('"', '""') for w in text.split()]
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def like_pattern(text):
+    # Substring match with LIKE's wildcards and the escape character taken literally
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+def snippet_html(snippet):
+    return str(escape(snippet)).replace(SNIPPET_OPEN, '<mark>').replace(SNIPPET_CLOSE, '</mark>')
+
+# ------------------ Log Upserts ------------------
+# Single-statement writes served by the unique (owner, day) indexes.
+# Each helper takes a list of row dicts (with `date` and `day`) and runs as one executemany.
+def upsert_habit_logs(rows):
+    stmt = sqlite_insert(HabitLog)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['habit_id', 'day'], set_={'value': stmt.excluded.value}
+    ), rows)
+
+def upsert_measurable_logs(rows):
+    stmt = sqlite_insert(MeasurableLog)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['measurable_id', 'day'], set_={'value': stmt.excluded.value}
+    ), rows)
+
+def upsert_journals(rows):
+    stmt = sqlite_insert(Journal)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'day'], set_={'content': stmt.excluded.content}
+    ), rows)
+
+def upsert_journal(user_id, date_str, content):
+    upsert_journals([{'user_id': user_id, 'date': date_str, 'day': day_ordinal(date_str), 'content': content}])
+
+# ------------------ Completion Bitmaps ------------------
+# Yes/no history per habit-year, shared by the calendar, analysis and visual
+# pages. Misses load whole years in one query; writes update bits in place.
+HABIT_BITMAP_CACHE_BYTES = 8 * 1024 * 1024
+
+def load_habit_years(habit_ids, year):
+    rows = models.habits_log_rows(habit_ids, *year_bounds(year))
+    loaded = defaultdict(list)
+    for habit_id, day, value in rows:
+        loaded[habit_id].append((day, value))
+    return loaded
+
+habit_bitmaps = BitmapCache(load_habit_years, max_bytes=HABIT_BITMAP_CACHE_BYTES)
+
+# ------------------ Definition Cache ------------------
+DEFINITION_CACHE_USERS = 1024
+DEFINITION_CACHE_TTL = 5 * 60
+
+def load_definitions(user_id):
+    return Definitions(tuple(models.habit_definitions(user_id)), tuple(models.measurable_definitions(user_id)))
+
+# Every route that changes a habit or measurable definition must call definitions.invalidate(user_id)
+definitions = DefinitionCache(load_definitions, max_users=DEFINITION_CACHE_USERS, ttl=DEFINITION_CACHE_TTL)
+
+# ------------------ Badge Cache ------------------
+DEFAULT_HABIT_COLOR = '#60a5fa'
+DEFAULT_MEASURABLE_COLOR = '#22c55e'
+BADGE_CACHE_SIZE = 512
+
+# (user_id, year, month) -> (habit_badges, measurable_badges), both {date_str: set(colors)}
+_badge_cache = OrderedDict()
+_badge_cache_lock = threading.Lock()
+_badge_cache_writes = 0  # bumped by invalidation, so a month loaded before it is not stored
+
+def query_badges(user_id, start_day, end_day):
+    # Habit colors come from the completion bitmaps, measurable colors from one grouped query
+    habits = definitions.habits(user_id)
+    done_days = habit_bitmaps.done_days([h.id for h in habits], start_day, end_day)
+    habit_rows = [(date.fromordinal(day).isoformat(), h.color or DEFAULT_HABIT_COLOR)
+                  for h in habits for day in done_days[h.id]]
+
+    measurable_rows = models.measurable_colors_by_date(user_id, start_day, end_day, DEFAULT_MEASURABLE_COLOR)
+
+    habit_badges = {}
+    measurable_badges = {}
+    for day, color in habit_rows:
+        habit_badges.setdefault(day, set()).add(color)
+    for day, color in measurable_rows:
+        measurable_badges.setdefault(day, set()).add(color)
+    return habit_badges, measurable_badges
+
+def get_month_badges(user_id, year, month):
+    key = (user_id, year, month)
+    with _badge_cache_lock:
+        if key in _badge_cache:
+            _badge_cache.move_to_end(key)
+            return _badge_cache[key]
+        writes = _badge_cache_writes
+
+    badges = query_badges(user_id, *month_bounds(year, month))
+
+    with _badge_cache_lock:
+        if writes != _badge_cache_writes:
+            return badges
+        _badge_cache[key] = badges
+        while len(_badge_cache) > BADGE_CACHE_SIZE:
+            _badge_cache.popitem(last=False)
+    return badges
+
+def refresh_day_badges(user_id, date_str):
+    # Write-through for a single day; months that are not cached are left alone
+    day = parse_day(date_str)
+    key = (user_id, day.year, day.month)
+    with _badge_cache_lock:
+        cached = _badge_cache.get(key)
+    if cached is None:
+        return
+
+    day_habits, day_measurables = query_badges(user_id, day.toordinal(), day.toordinal())
+    with _badge_cache_lock:
+        habit_badges, measurable_badges = cached
+        for badges, fresh in ((habit_badges, day_habits), (measurable_badges, day_measurables)):
+            if date_str in fresh:
+                badges[date_str] = fresh[date_str]
+            else:
+                badges.pop(date_str, None)
+
+def invalidate_badges(user_id=None):
+    global _badge_cache_writes
+    with _badge_cache_lock:
+        _badge_cache_writes += 1
+        for key in [k for k in _badge_cache if user_id is None or k[0] == user_id]:
+            del _badge_cache[key]
+
+# ------------------ Streaks ------------------
+# habit_streak holds each habit's all-time streaks. Writes after the last
+# completed day are applied in O(1); edits at or before it trigger a full
+# recompute of that habit, done in SQL as gaps-and-islands over "Yes" days.
+STREAK_RECOMPUTE_SQL = """
+    WITH runs AS (
+        SELECT habit_id, day, day - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY day) AS run
+        FROM habit_log
+        WHERE value = 1 {where}
+    ), islands AS (
+        SELECT habit_id, COUNT(*) AS length, MAX(day) AS last_day
+        FROM runs
+        GROUP BY habit_id, run
+    )
+    INSERT INTO habit_streak (habit_id, current_streak, longest_streak, last_completed)
+    SELECT habit_id,
+           (SELECT i.length FROM islands i WHERE i.habit_id = islands.habit_id ORDER BY i.last_day DESC LIMIT 1),
+           MAX(length),
+           MAX(last_day)
+    FROM islands
+    GROUP BY habit_id
+"""
+
+def recompute_streaks(habit_ids=None):
+    if habit_ids is None:
+        db.session.execute(db.text("DELETE FROM habit_streak"))
+        db.session.execute(db.text(STREAK_RECOMPUTE_SQL.format(where='')))
+        return
+    params = {f'h{i}': habit_id for i, habit_id in enumerate(habit_ids)}
+    placeholders = ', '.join(f':{name}' for name in params)
+    db.session.execute(db.text(f"DELETE FROM habit_streak WHERE habit_id IN ({placeholders})"), params)
+    db.session.execute(db.text(
+        STREAK_RECOMPUTE_SQL.format(where=f'AND habit_id IN ({placeholders})')
+    ), params)
+
+def changed_habit_values(day, values):
+    # Subset of {habit_id: bool} that differs from what is stored for `day`; unset counts as "No"
+    stored = dict(db.session.query(HabitLog.habit_id, HabitLog.value).filter(
+        HabitLog.habit_id.in_(values), HabitLog.day == day
+    ))
+    return {habit_id: value for habit_id, value in values.items() if bool(stored.get(habit_id)) != value}
+
+def apply_streak_changes(day, changes):
+    # changes: {habit_id: bool} of values that actually changed on `day`
+    if not changes:
+        return
+    streaks = {s.habit_id: s for s in HabitStreak.query.filter(HabitStreak.habit_id.in_(changes))}
+    recompute = []
+    for habit_id, value in changes.items():
+        streak = streaks.get(habit_id)
+        last = streak.last_completed if streak else None
+        if last is not None and day <= last:
+            recompute.append(habit_id)
+        elif not value:
+            continue  # "No" after the last completed day leaves stored streaks intact
+        elif streak is None:
+            db.session.add(HabitStreak(habit_id=habit_id, current_streak=1, longest_streak=1, last_completed=day))
+        else:
+            streak.current_streak = streak.current_streak + 1 if day == last + 1 else 1
+            streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+            streak.last_completed = day
+    if recompute:
+        db.session.flush()
+        recompute_streaks(recompute)
+
+def streak_summary(habit_id, today=None):
+    streak = models.habit_streak(habit_id)
+    if streak is None or streak.last_completed is None:
+        return {'current': 0, 'longest': 0, 'last_completed': None}
+    today = (today or date.today()).toordinal()
+    # A streak is still alive until a full day passes without a "Yes"
+    current = streak.current_streak if streak.last_completed >= today - 1 else 0
+    return {
+        'current': current,
+        'longest': streak.longest_streak,
+        'last_completed': date.fromordinal(streak.last_completed).isoformat()
+    }
+
+# ------------------ Rollups ------------------
+# Per-month aggregates of every habit and measurable. Write routes refresh
+# the touched month; `flask rebuild-rollups` recomputes everything.
+# Yearly totals are sums over at most twelve rollup rows. Months are taken
+# from the `day` ordinal (julianday = day + 1721424.5), like the range filters.
+HABIT_ROLLUP_SQL = """
+    INSERT INTO habit_month_rollup (habit_id, year, month, yes_count, logged_count)
+    SELECT habit_id, CAST(strftime('%Y', day + 1721424.5) AS INTEGER),
+           CAST(strftime('%m', day + 1721424.5) AS INTEGER),
+           SUM(value = 1), COUNT(*)
+    FROM habit_log
+    WHERE {where}
+    GROUP BY habit_id, 2, 3
+"""
+
+MEASURABLE_ROLLUP_SQL = """
+    INSERT INTO measurable_month_rollup (measurable_id, year, month, entries, total, minimum, maximum)
+    SELECT measurable_id, CAST(strftime('%Y', day + 1721424.5) AS INTEGER),
+           CAST(strftime('%m', day + 1721424.5) AS INTEGER),
+           SUM(value != 0), COALESCE(SUM(value), 0),
+           MIN(CASE WHEN value != 0 THEN value END), MAX(CASE WHEN value != 0 THEN value END)
+    FROM measurable_log
+    WHERE {where}
+    GROUP BY measurable_id, 2, 3
+"""
+
+def rebuild_rollups(habit_ids=None, measurable_ids=None):
+    # Every rollup, or all months of the given owners only
+    scoped = habit_ids is not None or measurable_ids is not None
+    for table, owner, sql, ids in (('habit_month_rollup', 'habit_id', HABIT_ROLLUP_SQL, habit_ids),
+                                   ('measurable_month_rollup', 'measurable_id', MEASURABLE_ROLLUP_SQL, measurable_ids)):
+        if not scoped:
+            db.session.execute(db.text(f"DELETE FROM {table}"))
+            db.session.execute(db.text(sql.format(where='1 = 1')))
+            continue
+        if not ids:
+            continue
+        params = {f'o{i}': owner_id for i, owner_id in enumerate(ids)}
+        placeholders = ', '.join(f':{name}' for name in params)
+        db.session.execute(db.text(f"DELETE FROM {table} WHERE {owner} IN ({placeholders})"), params)
+        db.session.execute(db.text(sql.format(where=f'{owner} IN ({placeholders})')), params)
+
+def refresh_rollups(day, habit_ids=(), measurable_ids=()):
+    # Recompute the month containing `day` for the given owners
+    month_day = date.fromordinal(day)
+    first, last = month_bounds(month_day.year, month_day.month)
+    for table, owner, sql, ids in (('habit_month_rollup', 'habit_id', HABIT_ROLLUP_SQL, habit_ids),
+                                   ('measurable_month_rollup', 'measurable_id', MEASURABLE_ROLLUP_SQL, measurable_ids)):
+        if not ids:
+            continue
+        params = {f'o{i}': owner_id for i, owner_id in enumerate(ids)}
+        params.update(year=month_day.year, month=month_day.month, first=first, last=last)
+        placeholders = ', '.join(f':o{i}' for i in range(len(ids)))
+        db.session.execute(db.text(
+            f"DELETE FROM {table} WHERE {owner} IN ({placeholders}) AND year = :year AND month = :month"
+        ), params)
+        db.session.execute(db.text(sql.format(
+            where=f'{owner} IN ({placeholders}) AND day BETWEEN :first AND :last'
+        )), params)
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute every monthly habit and measurable rollup."""
+    rebuild_rollups()
+    db.session.commit()
+    print("Rollups rebuilt")
+
+# ------------------ Conditional Requests ------------------
+# Every write bumps the owner's data_version inside its transaction. Read
+# routes derive a strong ETag from it and answer If-None-Match with a 304
+# before running their queries.
+def bump_data_version(user_id):
+    # Returns (user_id, new data_version), or None when there is no such user
+    return db.session.execute(
+        db.update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
+        .returning(User.id, User.data_version)
+    ).first()
+
+def current_data_version(user_id):
+    # Read at most once per request
+    if g.get('data_version_user') != user_id:
+        g.data_version = db.session.execute(db.select(User.data_version).where(User.id == user_id)).scalar()
+        g.data_version_user = user_id
+    return g.data_version
+
+# The definition, badge and bitmap caches are process-local, so each process
+# remembers the data_version its cached entries reflect. A request that finds
+# another version (a write from another worker) drops that user's entries
+# before anything reads them.
+_seen_versions = {}
+_seen_versions_lock = threading.Lock()
+
+@bp.before_app_request
+def sync_user_caches():
+    if 'user_id' not in session:
+        return
+    user_id = session['user_id']
+    version = current_data_version(user_id)
+    with _seen_versions_lock:
+        seen = _seen_versions.get(user_id)
+    if seen == version:
+        return
+    if seen is not None:
+        habit_ids = db.session.execute(db.select(Habit.id).where(Habit.user_id == user_id)).scalars().all()
+        habit_bitmaps.invalidate_many(habit_ids)
+        definitions.invalidate(user_id)
+        invalidate_badges(user_id)
+    with _seen_versions_lock:
+        _seen_versions[user_id] = version
+
+def note_local_write(bumped):
+    # Call after the write-through: the caches now reflect the bumped version,
+    # unless another worker wrote in between, which the next request picks up
+    if bumped is None:
+        return
+    user_id, version = bumped
+    with _seen_versions_lock:
+        if _seen_versions.get(user_id) == version - 1:
+            _seen_versions[user_id] = version
+
+def conditional_on_data_version(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            return view(*args, **kwargs)
+
+        user_id = session['user_id']
+        version = current_data_version(user_id)
+        # Pages that show "this month" also change with the calendar date
+        seed = f"{user_id}:{version}:{date.today().isoformat()}:{request.full_path}"
+        etag = hashlib.sha1(seed.encode()).hexdigest()
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+# ------------------ Instrumentation ------------------
+# SQL, template and total time for every request, sent back in a Server-Timing
+# header and aggregated per endpoint for /metrics. Statements are counted on
+# both pools while a request is being handled; background jobs are not counted.
+REQUESTS = metrics.Counter('habits_requests_total', 'Requests handled', ('endpoint', 'status'))
+REQUEST_DURATION = metrics.Histogram('habits_request_duration_seconds', 'Time to produce a response')
+REQUEST_SQL_QUERIES = metrics.Histogram('habits_request_sql_queries', 'SQL statements per request',
+                                        buckets=metrics.COUNT_BUCKETS)
+REQUEST_SQL_DURATION = metrics.Histogram('habits_request_sql_duration_seconds', 'Time spent in SQL per request')
+REQUEST_TEMPLATE_DURATION = metrics.Histogram('habits_request_template_duration_seconds',
+                                              'Time spent rendering templates per request')
+REPEATED_SQL = metrics.Counter('habits_repeated_sql_total',
+                               'Requests that ran one statement SQL_REPEAT_THRESHOLD times or more', ('endpoint',))
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'sql_time', 'render_time', 'render_started', 'statements')
+
+    def __init__(self, track_statements):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        self.statements = defaultdict(int) if track_statements else None
+
+def current_request_stats():
+    return g.get('request_stats') if has_request_context() else None
+
+def instrument_engine(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finish_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        stats = current_request_stats()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.sql_time += elapsed
+        if stats.statements is not None:
+            stats.statements[statement] += 1
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_failed_query(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+@before_render_template.connect
+def start_template_timer(sender, template, context, **extra):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.render_started = time.perf_counter()
+
+@template_rendered.connect
+def stop_template_timer(sender, template, context, **extra):
+    stats = current_request_stats()
+    if stats is not None and stats.render_started is not None:
+        stats.render_time += time.perf_counter() - stats.render_started
+        stats.render_started = None
+
+@bp.before_app_request
+def start_request_stats():
+    g.request_stats = RequestStats(track_statements=current_app.config['SQL_REPEAT_THRESHOLD'] > 0)
+
+@bp.after_app_request
+def record_request_stats(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    record = functools.partial(finish_request_stats, stats, endpoint, response.status_code,
+                               current_app.config['SQL_REPEAT_THRESHOLD'], current_app.logger)
+    if response.is_streamed:
+        # The body is generated after this hook, with the request context kept, so
+        # its queries and rendering still count; record them once it has been sent.
+        # Headers are already out by then, so streamed responses get no Server-Timing.
+        response.call_on_close(record)
+        return response
+
+    g.pop('request_stats')
+    stats, total = record()
+    if current_app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.queries} queries", '
+            f'tpl;dur={stats.render_time * 1000:.2f}, total;dur={total * 1000:.2f}'
+        )
+    return response
+
+def finish_request_stats(stats, endpoint, status_code, threshold, logger):
+    total = time.perf_counter() - stats.started
+    REQUESTS.inc(endpoint, str(status_code))
+    REQUEST_DURATION.observe(total, endpoint)
+    REQUEST_SQL_QUERIES.observe(stats.queries, endpoint)
+    REQUEST_SQL_DURATION.observe(stats.sql_time, endpoint)
+    REQUEST_TEMPLATE_DURATION.observe(stats.render_time, endpoint)
+
+    repeated = [(count, statement) for statement, count in (stats.statements or {}).items() if count >= threshold]
+    if repeated:
+        REPEATED_SQL.inc(endpoint)
+        for count, statement in sorted(repeated, reverse=True):
+            logger.warning("Possible N+1 in %s: %d x %s", endpoint, count, ' '.join(statement.split())[:300])
+    return stats, total
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+
+    lines = []
+    for metric in (REQUESTS, REQUEST_DURATION, REQUEST_SQL_QUERIES, REQUEST_SQL_DURATION,
+                   REQUEST_TEMPLATE_DURATION, REPEATED_SQL):
+        lines += metric.render()
+
+    bitmaps = habit_bitmaps.stats()
+    lines += metrics.sample('habits_bitmap_cache_entries', 'Cached habit-years', bitmaps['entries'])
+    lines += metrics.sample('habits_bitmap_cache_bytes', 'Approximate bitmap cache size', bitmaps['bytes'])
+    lines += metrics.sample('habits_bitmap_cache_max_bytes', 'Bitmap cache budget', bitmaps['max_bytes'])
+    for key in ('hits', 'misses', 'evictions'):
+        lines += metrics.sample(f'habits_bitmap_cache_{key}_total', f'Bitmap cache {key}', bitmaps[key], 'counter')
+
+    cached = definitions.stats()
+    lines += metrics.sample('habits_definition_cache_entries', 'Users with cached definitions', cached['entries'])
+    for key in ('hits', 'misses'):
+        lines += metrics.sample(f'habits_definition_cache_{key}_total', f'Definition cache {key}', cached[key], 'counter')
+
+    hashing = current_app.extensions['password_hasher'].stats()
+    operations = ('hash', 'check')
+    lines += metrics.sample('habits_password_hash_operations_total', 'Password hash and check calls',
+                            {(('operation', op),): hashing[op]['count'] for op in operations}, 'counter')
+    lines += metrics.sample('habits_password_hash_latency_milliseconds', 'Recent password hashing latency', {
+        (('operation', op), ('quantile', q)): hashing[op][f'p{int(float(q) * 100)}_ms']
+        for op in operations for q in ('0.5', '0.95', '0.99')
+    })
+    lines += metrics.sample('habits_password_hash_rejected_total', 'Calls turned away by a full queue',
+                            hashing['rejected'], 'counter')
+    lines += metrics.sample('habits_password_rehashed_total', 'Hashes upgraded on login', hashing['rehashed'], 'counter')
+
+    jobs = current_app.extensions['export_jobs'].stats()
+    lines += metrics.sample('habits_export_jobs', 'Export jobs by state', {
+        (('state', 'active'),): jobs['active'],
+        (('state', 'finished'),): jobs['jobs'] - jobs['active']
+    })
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 # ------------------ Routes ------------------
-@app.route('/')
+@bp.route('/')
 def home():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     username = session.get('username')
     year = request.args.get('year', type=int)
@@ -91,36 +865,8 @@ def home():
             'is_today': day == today.day and month == today.month and year == today.year
         })
 
-    start_date = f"{year}-{month:02d}-01"
-    end_date = f"{year}-{month:02d}-{days_in_month:02d}"
-
-    habit_logs = HabitLog.query.join(Habit).filter(
-        Habit.user_id == session['user_id'],
-        HabitLog.date.between(start_date, end_date)
-    ).all()
-
-    measurable_logs = MeasurableLog.query.join(Measurable).filter(
-        Measurable.user_id == session['user_id'],
-        MeasurableLog.date.between(start_date, end_date)
-    ).all()
-
-    # Separate badge maps
-    habit_badges = {}
-    measurable_badges = {}
-
-    for log in habit_logs:
-        if log.value:  # Only if marked "Yes"
-            habit = Habit.query.get(log.habit_id)
-            if habit:
-                color = habit.color or '#60a5fa'
-                habit_badges.setdefault(log.date, set()).add(color)
-
-    for log in measurable_logs:
-        if log.value and log.value > 0:
-            measurable = Measurable.query.get(log.measurable_id)
-            if measurable:
-                color = measurable.color or '#22c55e'
-                measurable_badges.setdefault(log.date, set()).add(color)
+    # Distinct colors per day, served from the badge cache when possible
+    habit_badges, measurable_badges = get_month_badges(session['user_id'], year, month)
 
     month_name = datetime(year, month, 1).strftime('%B %Y')
     next_month, next_year = (1, year + 1) if month == 12 else (month + 1, year)
@@ -128,13 +874,14 @@ def home():
     show_prev = (year > today.year) or (year == today.year and month > today.month)
 
     return render_template('home.html', username=username, days=days, month_name=month_name,
+                           range_start=days[0]['date_str'], range_end=days[-1]['date_str'],
                            next_year=next_year, next_month=next_month,
                            prev_year=prev_year, prev_month=prev_month,
                            show_prev=show_prev,
                            habit_badges=habit_badges,
                            measurable_badges=measurable_badges)
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username'].strip()
@@ -142,44 +889,57 @@ def register():
 
         if not username or not password:
             flash('Please fill out both fields', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
 
-        hashed_password = generate_password_hash(password)
         if User.query.filter_by(username=username).first():
             flash('Username already taken', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
+        try:
+            hashed_password = current_app.extensions['password_hasher'].hash(password)
+        except HasherBusy:
+            flash('Too many sign-ups right now, please try again in a moment', 'error')
+            return render_template('register.html'), 503, {'Retry-After': '5'}
 
         new_user = User(username=username, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
 
         flash('Registration successful! Please login.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username'].strip()
         password = request.form['password']
 
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        hasher = current_app.extensions['password_hasher']
+        try:
+            valid, new_hash = hasher.verify(user.password, password) if user else (False, None)
+        except HasherBusy:
+            flash('Too many sign-ins right now, please try again in a moment', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
+        if new_hash:
+            user.password = new_hash
+            db.session.commit()
+        if valid:
             session['user_id'] = user.id
             session['username'] = username
             flash('Login successful!', 'success')
-            return redirect(url_for('home'))
+            return redirect(url_for('main.home'))
         else:
             flash('Invalid username or password', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
     return render_template('login.html')
 
-@app.route('/add_habit', methods=['POST'])
+@bp.route('/add_habit', methods=['POST'])
 def add_habit():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     if request.form.get('type') == 'measurable':
         new_measurable = Measurable(
@@ -203,21 +963,30 @@ def add_habit():
         )
         db.session.add(new_habit)
 
+    bumped = bump_data_version(user_id=session['user_id'])
     db.session.commit()
+    definitions.invalidate(session['user_id'])
+    invalidate_badges(session['user_id'])
+    note_local_write(bumped)
     flash("Habit added successfully", "success")
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
-@app.route('/day_data/<date_str>')
+@bp.route('/day_data/<date_str>')
+@conditional_on_data_version
 def day_data(date_str):
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
 
     user_id = session['user_id']
-    habits = Habit.query.filter_by(user_id=user_id).all()
-    measurables = Measurable.query.filter_by(user_id=user_id).all()
+    habits, measurables = definitions.get(user_id)
 
-    habit_logs = {log.habit_id: log.value for log in HabitLog.query.filter_by(date=date_str).all()}
-    measurable_logs = {log.measurable_id: log.value for log in MeasurableLog.query.filter_by(date=date_str).all()}
+    try:
+        day = day_ordinal(date_str)
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+
+    habit_logs = habit_bitmaps.day_values([h.id for h in habits], day)
+    measurable_logs = {row.measurable_id: row.value for row in models.user_measurable_log_rows(user_id, day, day)}
 
     return jsonify({
         'habits': [{'id': h.id, 'name': h.name, 'question': h.question} for h in habits],
@@ -226,60 +995,168 @@ def day_data(date_str):
         'measurable_logs': measurable_logs
     })
 
-@app.route('/update_habit', methods=['POST'])
+RANGE_DATA_MAX_DAYS = 93
+
+@bp.route('/range_data')
+@conditional_on_data_version
+def range_data():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    try:
+        start, end = parse_day(request.args.get('start', '')), parse_day(request.args.get('end', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+    first, last = start.toordinal(), end.toordinal()
+    if last < first or last - first >= RANGE_DATA_MAX_DAYS:
+        return jsonify({'error': f'Range must cover 1 to {RANGE_DATA_MAX_DAYS} days'}), 400
+
+    user_id = session['user_id']
+    habits, measurables = definitions.get(user_id)
+
+    habit_rows = models.user_habit_log_rows(user_id, first, last)
+    measurable_rows = models.user_measurable_log_rows(user_id, first, last)
+
+    # Columnar logs; `offset` counts days from `start`
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'habits': [{'id': h.id, 'name': h.name, 'question': h.question} for h in habits],
+        'measurables': [{'id': m.id, 'name': m.name, 'question': m.question} for m in measurables],
+        'habit_logs': {
+            'habit_id': [row.habit_id for row in habit_rows],
+            'offset': [row.day - first for row in habit_rows],
+            'value': [row.value for row in habit_rows]
+        },
+        'measurable_logs': {
+            'measurable_id': [row.measurable_id for row in measurable_rows],
+            'offset': [row.day - first for row in measurable_rows],
+            'value': [row.value for row in measurable_rows]
+        }
+    })
+
+@bp.route('/update_habit', methods=['POST'])
 def update_habit():
-    habit_id = request.form['habit_id']
-    date = request.form['date']
-    value = request.form['value'] == 'true'
-
-    log = HabitLog.query.filter_by(habit_id=habit_id, date=date).first()
-    if not log:
-        log = HabitLog(habit_id=habit_id, date=date, value=value)
-        db.session.add(log)
-    else:
-        log.value = value
+    if 'user_id' not in session:
+        return 'Not logged in', 401
+    try:
+        habit_id = int(request.form['habit_id'])
+    except (KeyError, ValueError):
+        return 'Invalid habit_id', 400
+    user_id = session['user_id']
+    if definitions.habit(user_id, habit_id) is None:
+        return 'Unknown habit', 404
+    value = request.form.get('value') == 'true'
+    try:
+        date = parse_day(request.form.get('date', '')).isoformat()
+    except ValueError:
+        return 'Invalid date', 400
+    day = day_ordinal(date)
+
+    changes = changed_habit_values(day, {habit_id: value})
+    upsert_habit_logs([{'habit_id': habit_id, 'date': date, 'day': day, 'value': value}])
+    apply_streak_changes(day, changes)
+    refresh_rollups(day, habit_ids=[habit_id])
+    bumped = bump_data_version(user_id=user_id)
     db.session.commit()
+    habit_bitmaps.set_day(habit_id, day, value)
+    refresh_day_badges(user_id, date)
+    note_local_write(bumped)
     return 'OK'
 
-@app.route('/update_measurable', methods=['POST'])
+@bp.route('/update_measurable', methods=['POST'])
 def update_measurable():
-    measurable_id = request.form['measurable_id']
-    date = request.form['date']
-    value = float(request.form['value'])
-
-    log = MeasurableLog.query.filter_by(measurable_id=measurable_id, date=date).first()
-    if not log:
-        log = MeasurableLog(measurable_id=measurable_id, date=date, value=value)
-        db.session.add(log)
-    else:
-        log.value = value
+    if 'user_id' not in session:
+        return 'Not logged in', 401
+    try:
+        measurable_id = int(request.form['measurable_id'])
+        value = float(request.form['value'])
+        if not math.isfinite(value):
+            raise ValueError('value must be a finite number')
+    except (KeyError, ValueError):
+        return 'Invalid measurable_id or value', 400
+    user_id = session['user_id']
+    if definitions.measurable(user_id, measurable_id) is None:
+        return 'Unknown measurable', 404
+    try:
+        date = parse_day(request.form.get('date', '')).isoformat()
+    except ValueError:
+        return 'Invalid date', 400
+    day = day_ordinal(date)
+
+    upsert_measurable_logs([{'measurable_id': measurable_id, 'date': date, 'day': day, 'value': value}])
+    refresh_rollups(day, measurable_ids=[measurable_id])
+    bumped = bump_data_version(user_id=user_id)
     db.session.commit()
+    refresh_day_badges(user_id, date)
+    note_local_write(bumped)
     return 'OK'
 
-@app.route('/habit_analysis')
+@bp.route('/api/day/<date_str>', methods=['POST'])
+def update_day(date_str):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    try:
+        day = parse_day(date_str)
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+    date_str, day = day.isoformat(), day.toordinal()
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        habit_values = {int(k): v for k, v in (payload.get('habits') or {}).items()}
+        if not all(isinstance(v, bool) for v in habit_values.values()):
+            raise ValueError('habit values must be true or false')
+        measurable_values = {int(k): float(v or 0) for k, v in (payload.get('measurables') or {}).items()}
+        if not all(math.isfinite(v) for v in measurable_values.values()):
+            raise ValueError('measurable values must be finite numbers')
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({'error': 'Invalid payload'}), 400
+
+    # One ownership check per table for the whole day
+    user_id = session['user_id']
+    habits, measurables = definitions.get(user_id)
+    if not set(habit_values) <= {h.id for h in habits}:
+        return jsonify({'error': 'Unknown habit'}), 404
+    if not set(measurable_values) <= {m.id for m in measurables}:
+        return jsonify({'error': 'Unknown measurable'}), 404
+
+    if habit_values:
+        changes = changed_habit_values(day, habit_values)
+        upsert_habit_logs([{'habit_id': k, 'date': date_str, 'day': day, 'value': v}
+                           for k, v in habit_values.items()])
+        apply_streak_changes(day, changes)
+    if measurable_values:
+        upsert_measurable_logs([{'measurable_id': k, 'date': date_str, 'day': day, 'value': v}
+                                for k, v in measurable_values.items()])
+    refresh_rollups(day, habit_ids=list(habit_values), measurable_ids=list(measurable_values))
+    bumped = bump_data_version(user_id=user_id)
+    db.session.commit()
+    for habit_id, value in habit_values.items():
+        habit_bitmaps.set_day(habit_id, day, value)
+    refresh_day_badges(user_id, date_str)
+    note_local_write(bumped)
+
+    return jsonify({'status': 'ok', 'habits': len(habit_values), 'measurables': len(measurable_values)})
+
+@bp.route('/habit_analysis')
+@read_only
+@conditional_on_data_version
 def habit_analysis():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     today = date.today()
     year, month = today.year, today.month
     user_id = session['user_id']
 
-    # Get all habits
-    habits = Habit.query.filter_by(user_id=user_id).all()
+    habits = definitions.habits(user_id)
 
-    # Get logs for current month
-    logs = HabitLog.query.join(Habit).filter(
-        Habit.user_id == user_id,
-        HabitLog.date.like(f"{year}-{month:02d}-%"),
-        HabitLog.value == True
-    ).all()
-
-    # Group logs by habit and collect marked "yes" dates
-    from collections import defaultdict
-    marked_dates = defaultdict(list)
-    for log in logs:
-        marked_dates[log.habit_id].append(log.date)
+    # Marked "yes" dates of the current month, per habit
+    done_days = habit_bitmaps.done_days([h.id for h in habits], *month_bounds(year, month))
+    marked_dates = {habit_id: [date.fromordinal(day).isoformat() for day in days]
+                    for habit_id, days in done_days.items()}
 
     month_days = calendar.monthrange(year, month)[1]
     calendar_days = [
@@ -294,115 +1171,82 @@ def habit_analysis():
     return render_template("habit_analysis.html", habits=habits, marked_dates=marked_dates,
                            calendar_days=calendar_days, month=month, year=year, username=username)
 
-@app.route('/habit_visual/<int:habit_id>')
+@bp.route('/habit_visual/<int:habit_id>')
+@read_only
 def habit_visual(habit_id):
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-
-    from datetime import timedelta
-
-    view = request.args.get('view', 'month')  # options: week, month, year
-    habit = Habit.query.filter_by(id=habit_id, user_id=session['user_id']).first_or_404()
-    logs = HabitLog.query.filter_by(habit_id=habit.id).order_by(HabitLog.date).all()
+        return redirect(url_for('main.login'))
 
-    log_map = {log.date: log.value for log in logs}
-    today = datetime.today()
-
-    labels = []
-    values = []
-    yes_count = 0
-    no_count = 0
-    streak = 0
-    longest_streak = 0
-    last_yes = None
-
-    if view == "week":
-        # Week starts on Sunday
-        days_since_sunday = (today.weekday() + 1) % 7
-        start_date = today - timedelta(days=days_since_sunday)
-        days = [(start_date + timedelta(days=i)).date() for i in range(7)]
-        labels = [d.strftime("%a %d") for d in days]
-
-        for d in days:
-            date_str = d.strftime("%Y-%m-%d")
-            value = log_map.get(date_str, False)
-            values.append(10 if value else 0)
-
-            if value:
-                yes_count += 1
-                if last_yes and d == last_yes + timedelta(days=1):
-                    streak += 1
-                else:
-                    streak = 1
-                last_yes = d
-            else:
-                no_count += 1
-                streak = 0
-            longest_streak = max(longest_streak, streak)
+    view = request.args.get('view', 'month')  # options: week, month, year, all
+    habit = definitions.habit(session['user_id'], habit_id)
+    if habit is None:
+        abort(404)
+    today = date.today()
 
-    elif view == "year":
+    if view == "year":
         labels = calendar.month_name[1:]
         values = [0] * 12
-        for log in logs:
-            if log.value:
-                month = int(log.date[5:7])
-                values[month - 1] += 10
+        for rollup in models.habit_month_rollups(habit.id, today.year):
+            values[rollup.month - 1] = rollup.yes_count * 10
         yes_count = sum(1 for v in values if v > 0)
         no_count = 12 - yes_count
         return render_template("habit_visual.html", habit=habit, view=view,
                                labels=labels, values=values,
                                yes_count=yes_count, no_count=no_count,
-                               longest_streak=0)
+                               streaks=streak_summary(habit.id))
 
+    if view == "week":
+        start, end = week_bounds(today)
+    elif view == "all":
+        # Opt-in full history: first log up to today
+        first = models.first_habit_day(habit.id)
+        start, end = min(first or today.toordinal(), today.toordinal()), today.toordinal()
     else:  # view == "month"
-        year, month = today.year, today.month
-        month_days = calendar.monthrange(year, month)[1]
-        days = [datetime(year, month, day).date() for day in range(1, month_days + 1)]
-        labels = [d.strftime("%b %d") for d in days]
-
-        for d in days:
-            date_str = d.strftime("%Y-%m-%d")
-            value = log_map.get(date_str, False)
-            values.append(10 if value else 0)
-
-            if value:
-                yes_count += 1
-                if last_yes and d == last_yes + timedelta(days=1):
-                    streak += 1
-                else:
-                    streak = 1
-                last_yes = d
-            else:
-                no_count += 1
-                streak = 0
-            longest_streak = max(longest_streak, streak)
+        start, end = month_bounds(today.year, today.month)
+
+    # Week and month come from the bitmap cache; the full history is read directly
+    rows = models.habit_log_rows(habit.id, start, end) if view == "all" else habit_bitmaps.range_rows(habit.id, start, end)
+    done, logged = analytics.habit_series(rows, start, end)
+    yes_count = int(done.sum())
+    no_count = done.size - yes_count
+
+    weekday_rates = []
+    if view == "all":
+        months, sums, _ = analytics.month_breakdown(start, done.astype(float))
+        labels = [m.strftime("%b %Y") for m in months]
+        values = [int(v) * 10 for v in sums]
+        hits, days = analytics.weekday_breakdown(start, done)
+        weekday_rates = [(name, round(int(h) / int(d) * 100) if d else 0)
+                         for name, h, d in zip(analytics.WEEKDAYS, hits, days)]
+    else:
+        labels = [date.fromordinal(d).strftime("%a %d" if view == "week" else "%b %d") for d in range(start, end + 1)]
+        values = [10 if v else 0 for v in done]
 
     return render_template("habit_visual.html", habit=habit, view=view,
                            labels=labels, values=values,
                            yes_count=yes_count, no_count=no_count,
-                           longest_streak=longest_streak)
-
-@app.route('/measurable_analysis')
+                           longest_streak=analytics.longest_run(done),
+                           completion_rate=analytics.completion_rate(done, logged),
+                           weekday_rates=weekday_rates,
+                           streaks=streak_summary(habit.id))
+
+@bp.route('/measurable_analysis')
+@read_only
+@conditional_on_data_version
 def measurable_analysis():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
-    from collections import defaultdict
 
     today = datetime.today()
     year, month = today.year, today.month
     user_id = session['user_id']
 
-    measurables = Measurable.query.filter_by(user_id=user_id).all()
-
-    logs = MeasurableLog.query.join(Measurable).filter(
-        Measurable.user_id == user_id,
-        MeasurableLog.date.like(f"{year}-{month:02d}-%")
-    ).all()
+    measurables = definitions.measurables(user_id)
 
     marked_units = defaultdict(dict)
-    for log in logs:
-        marked_units[log.measurable_id][log.date] = log.value
+    for row in models.user_measurable_log_rows(user_id, *month_bounds(year, month)):
+        marked_units[row.measurable_id][date.fromordinal(row.day).isoformat()] = row.value
 
     days = [
         {
@@ -417,210 +1261,618 @@ def measurable_analysis():
                            marked_units=marked_units, calendar_days=days,
                            month=month, year=year, username=username)
 
-@app.route('/measurable_visual/<int:measurable_id>')
+@bp.route('/measurable_visual/<int:measurable_id>')
+@read_only
 def measurable_visual(measurable_id):
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-
-    from datetime import timedelta
-
-    view = request.args.get('view', 'month')
-    m = Measurable.query.filter_by(id=measurable_id, user_id=session['user_id']).first_or_404()
-    logs = MeasurableLog.query.filter_by(measurable_id=m.id).order_by(MeasurableLog.date).all()
-
-    log_map = {log.date: log.value for log in logs}
-    today = datetime.today()
-
-    labels = []
-    values = []
-    valid_values = []
+        return redirect(url_for('main.login'))
 
-    if view == "week":
-        # Week starts Sunday
-        days_since_sunday = (today.weekday() + 1) % 7
-        start_date = today - timedelta(days=days_since_sunday)
-        days = [(start_date + timedelta(days=i)).date() for i in range(7)]
-        labels = [d.strftime("%a %d") for d in days]
+    # options: week, month, quarter, year, all, or custom with start/end
+    view = request.args.get('view', 'custom' if request.args.get('start') else 'month')
+    m = definitions.measurable(session['user_id'], measurable_id)
+    if m is None:
+        abort(404)
+    today = date.today()
 
+    if view == "custom":
+        try:
+            start, end = (parse_day(request.args.get('start', '')).toordinal(),
+                          parse_day(request.args.get('end') or today.isoformat()).toordinal())
+        except ValueError:
+            return 'Invalid date', 400
+        if end < start:
+            return 'Start must not be after end', 400
+    elif view == "week":
+        start, end = week_bounds(today)
+    elif view == "quarter":
+        start, end = quarter_bounds(today)
     elif view == "year":
-        labels = calendar.month_name[1:]
-        values = [0] * 12
-        for log in logs:
-            month = int(log.date[5:7])
-            values[month - 1] += float(log.value)
-        avg = round(sum(values) / max(1, len([v for v in values if v > 0])), 2)
-        return render_template("measurable_visual.html", m=m, view=view,
-                               labels=labels, values=values, avg=avg,
-                               highest=max(values), lowest=min(values))
-
+        start, end = year_bounds(today.year)
+    elif view == "all":
+        first = models.first_measurable_day(m.id)
+        start, end = min(first or today.toordinal(), today.toordinal()), today.toordinal()
     else:  # month
-        year, month = today.year, today.month
-        days = [datetime(year, month, d).date() for d in range(1, calendar.monthrange(year, month)[1] + 1)]
-        labels = [d.strftime("%b %d") for d in days]
-
-    if view in ['week', 'month']:
-        for d in days:
-            date_str = d.strftime("%Y-%m-%d")
-            val = float(log_map.get(date_str, 0))
-            values.append(val)
-            if val > 0:
-                valid_values.append(val)
-
-        avg = round(sum(valid_values) / len(valid_values), 2) if valid_values else 0
-        high = max(valid_values) if valid_values else 0
-        low = min(valid_values) if valid_values else 0
+        view = "month"
+        start, end = month_bounds(today.year, today.month)
 
+    if view == "year":
+        # Monthly totals straight from the rollups; the average is per entry, like the daily views
+        labels = calendar.month_name[1:]
+        values = [0] * 12
+        entries = total = 0
+        highest = lowest = None
+        for rollup in models.measurable_month_rollups(m.id, today.year):
+            values[rollup.month - 1] = rollup.total
+            entries += rollup.entries
+            total += rollup.total
+            if rollup.maximum is not None:
+                highest = rollup.maximum if highest is None else max(highest, rollup.maximum)
+                lowest = rollup.minimum if lowest is None else min(lowest, rollup.minimum)
         return render_template("measurable_visual.html", m=m, view=view,
-                               labels=labels, values=values,
-                               avg=avg, highest=high, lowest=low)
+                               start=date.fromordinal(start).isoformat(), end=date.fromordinal(end).isoformat(),
+                               labels=labels, values=values, avg=round(total / entries, 2) if entries else 0,
+                               highest=highest or 0, lowest=lowest or 0)
+
+    # Load the days before the range too, so the rolling averages are complete on day one
+    lead = max(ROLLING_WINDOWS) - 1
+    series = analytics.measurable_series(models.measurable_log_rows(m.id, start - lead, end), start - lead, end)
+    rolling = {window: analytics.rolling_mean(series, window)[lead:] for window in ROLLING_WINDOWS}
+    series = series[lead:]
+    stats = analytics.value_summary(series)
+    target = analytics.parse_target(m.unit_target)
 
-@app.route('/journal/<date>', methods=['GET'])
+    if view == "week":
+        label_format = "%a %d"
+    elif date.fromordinal(start).year == date.fromordinal(end).year:
+        label_format = "%b %d"
+    else:
+        label_format = "%b %d, %Y"
+    days = analytics.chart_points(series, CHART_MAX_POINTS)
+    labels = [date.fromordinal(start + int(d)).strftime(label_format) for d in days]
+
+    return render_template("measurable_visual.html", m=m, view=view,
+                           start=date.fromordinal(start).isoformat(), end=date.fromordinal(end).isoformat(),
+                           labels=labels, values=analytics.to_chart(series[days], fill=0),
+                           rolling7=analytics.to_chart(rolling[7][days]),
+                           rolling30=analytics.to_chart(rolling[30][days]),
+                           avg=stats['avg'], highest=stats['highest'], lowest=stats['lowest'],
+                           percentiles=analytics.percentiles(series),
+                           attainment=analytics.target_attainment(series, target, m.target_type))
+
+@bp.route('/journal/<date>', methods=['GET'])
+@conditional_on_data_version
 def get_journal(date):
     if 'user_id' not in session:
         return '', 401
-    entry = Journal.query.filter_by(user_id=session['user_id'], date=date).first()
-    return entry.content if entry else ''
+    try:
+        day = day_ordinal(date)
+    except ValueError:
+        return 'Invalid date', 400
+    return models.journal_content(session['user_id'], day) or ''
 
-@app.route('/journal/<date>', methods=['POST'])
+@bp.route('/journal/<date>', methods=['POST'])
 def save_journal(date):
     if 'user_id' not in session:
         return '', 401
     content = request.form.get('content', '')
-    entry = Journal.query.filter_by(user_id=session['user_id'], date=date).first()
-    if entry:
-        entry.content = content
-    else:
-        entry = Journal(user_id=session['user_id'], date=date, content=content)
-        db.session.add(entry)
+    try:
+        date = parse_day(date).isoformat()
+    except ValueError:
+        return 'Invalid date', 400
+    upsert_journal(session['user_id'], date, content)
+    bumped = bump_data_version(user_id=session['user_id'])
     db.session.commit()
+    note_local_write(bumped)
     return 'Saved'
 
-@app.route('/all_journals')
-def all_journals():
+@bp.route('/journals/search')
+@conditional_on_data_version
+def search_journals():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-
-    from collections import defaultdict
+        return jsonify({'error': 'Not logged in'}), 401
 
-    entries = Journal.query.filter_by(user_id=session['user_id']).order_by(Journal.date.desc()).all()
+    query = fts_query(request.args.get('q', ''))
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+    if query is None:
+        return jsonify({'results': [], 'page': page, 'per_page': per_page, 'has_more': False})
+
+    params = {'user_id': session['user_id'], 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    if journal_search_available():
+        params['query'] = query
+        rows = db.session.execute(db.text(f"""
+            SELECT j.date, snippet(journal_fts, 0, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', 16), bm25(journal_fts)
+            FROM journal_fts JOIN journal j ON j.id = journal_fts.rowid
+            WHERE journal_fts MATCH :query AND j.user_id = :user_id
+            ORDER BY bm25(journal_fts)
+            LIMIT :limit OFFSET :offset
+        """), params).all()
+    else:
+        params['pattern'] = like_pattern(request.args.get('q', '').strip())
+        rows = db.session.execute(db.text("""
+            SELECT date, substr(content, 1, 160), 0
+            FROM journal
+            WHERE user_id = :user_id AND content LIKE :pattern ESCAPE '\\'
+            ORDER BY day DESC
+            LIMIT :limit OFFSET :offset
+        """), params).all()
 
-    journal_map = defaultdict(list)
-    for entry in entries:
-        dt = datetime.strptime(entry.date, "%Y-%m-%d")
-        key = dt.strftime("%B %Y")  # e.g. "June 2024"
-        journal_map[key].append({'date': entry.date, 'text': entry.content})
+    return jsonify({
+        'results': [{'date': row[0], 'snippet': snippet_html(row[1] or ''), 'rank': round(row[2], 4)}
+                    for row in rows[:per_page]],
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page
+    })
 
-    return render_template("all_journals.html", journal_map=journal_map)
+JOURNAL_PAGE_SIZE = 40
+JOURNAL_PREVIEW_CHARS = 140
+
+def journal_page(user_id, before=None, limit=JOURNAL_PAGE_SIZE):
+    # Keyset page of entries older than the `before` day ordinal, newest first and
+    # grouped by month. Only a preview of each entry is read; full bodies come
+    # from /journal/<date> when opened. Returns (months, next cursor or None).
+    query = db.select(
+        Journal.day, Journal.date,
+        db.func.substr(Journal.content, 1, JOURNAL_PREVIEW_CHARS),
+        db.func.length(Journal.content) > JOURNAL_PREVIEW_CHARS
+    ).where(Journal.user_id == user_id)
+    if before is not None:
+        query = query.where(Journal.day < before)
+    rows = db.session.execute(query.order_by(Journal.day.desc()).limit(limit + 1)).all()
+    next_cursor = rows[limit - 1].date if len(rows) > limit else None
+    rows = rows[:limit]
+    if not rows:
+        return [], None
+
+    # Entry counts for every month on the page, including the parts on other pages;
+    # day-only query over the (user_id, day) index
+    first, _ = month_bounds(date.fromordinal(rows[-1].day).year, date.fromordinal(rows[-1].day).month)
+    _, last = month_bounds(date.fromordinal(rows[0].day).year, date.fromordinal(rows[0].day).month)
+    totals = defaultdict(int)
+    for (day,) in db.session.execute(db.select(Journal.day).where(
+        Journal.user_id == user_id, Journal.day.between(first, last)
+    )):
+        totals[date.fromordinal(day).strftime('%Y-%m')] += 1
+
+    months = []
+    for key, entries in itertools.groupby(rows, key=lambda row: row.date[:7]):
+        year, month = key.split('-')
+        months.append({
+            'key': key,
+            'label': f"{calendar.month_name[int(month)]} {year}",  # e.g. "June 2024"
+            'total': totals[key],
+            'entries': [{'date': entry_date, 'preview': preview, 'truncated': bool(truncated)}
+                        for _, entry_date, preview, truncated in entries]
+        })
+    return months, next_cursor
 
-# ------------------ Export Routes ------------------
-@app.route('/api/export/json')
-def export_json():
+@bp.route('/journals/page')
+@conditional_on_data_version
+def journals_page():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
-
+    before = request.args.get('before')
     try:
-        user_id = session['user_id']
+        before = day_ordinal(before) if before else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+
+    months, next_cursor = journal_page(session['user_id'], before)
+    return jsonify({'months': months, 'next': next_cursor})
+
+@bp.route('/all_journals')
+def all_journals():
+    if 'user_id' not in session:
+        return redirect(url_for('main.login'))
+
+    months, next_cursor = journal_page(session['user_id'])
+    # Streamed so the first months reach the browser before the rest is rendered
+    return stream_template("all_journals.html", months=months, next_cursor=next_cursor)
 
-        # Get all habits
-        habits = Habit.query.filter_by(user_id=user_id).all()
-        habit_logs = HabitLog.query.join(Habit).filter(Habit.user_id == user_id).all()
-
-        # Get all measurables
-        measurables = Measurable.query.filter_by(user_id=user_id).all()
-        measurable_logs = MeasurableLog.query.join(Measurable).filter(Measurable.user_id == user_id).all()
-
-        # Get all journals
-        journals = Journal.query.filter_by(user_id=user_id).all()
-
-        # Prepare export data
-        export_data = {
-            'export_info': {
-                'export_date': datetime.now().isoformat(),
-                'user': session.get('username', 'Unknown'),
-                'total_habits': len(habits),
-                'total_measurables': len(measurables),
-                'total_journal_entries': len(journals)
-            },
-            'habits': [
-                {
-                    'id': h.id,
-                    'name': h.name,
-                    'type': h.type,
-                    'question': h.question,
-                    'notes': h.notes,
-                    'color': h.color,
-                    'logs': [
-                        {
-                            'date': log.date,
-                            'value': log.value
-                        }
-                        for log in habit_logs if log.habit_id == h.id
-                    ]
-                }
-                for h in habits
-            ],
-            'measurables': [
-                {
-                    'id': m.id,
-                    'name': m.name,
-                    'question': m.question,
-                    'unit_target': m.unit_target,
-                    'target_type': m.target_type,
-                    'notes': m.notes,
-                    'color': m.color,
-                    'logs': [
-                        {
-                            'date': log.date,
-                            'value': log.value
-                        }
-                        for log in measurable_logs if log.measurable_id == m.id
-                    ]
-                }
-                for m in measurables
-            ],
-            'journals': [
-                {
-                    'date': j.date,
-                    'content': j.content
-                }
-                for j in journals
-            ],
-            'statistics': {
-                'habit_completion_rates': {},
-                'measurable_averages': {}
+# ------------------ Export Routes ------------------
+EXPORT_BATCH_SIZE = 1000
+EXPORT_SECTIONS = {'habit': 'habits', 'measurable': 'measurables', 'journal': 'journals'}
+
+def merge_logs(definitions, rows):
+    # definitions and rows are both ordered by owner id; rows are (owner_id, ...) tuples
+    grouped = itertools.groupby(rows, key=lambda row: row[0])
+    pending = next(grouped, None)
+    for definition in definitions:
+        while pending is not None and pending[0] < definition.id:
+            pending = next(grouped, None)
+        if pending is not None and pending[0] == definition.id:
+            yield definition, pending[1]
+            pending = next(grouped, None)
+        else:
+            yield definition, ()
+
+def export_statistics(habits, measurables):
+    # Completion rates and measurable averages summed from the monthly rollups
+    habit_names = {h.id: h.name for h in habits}
+    measurable_names = {m.id: m.name for m in measurables}
+    stats = {'habit_completion_rates': {}, 'measurable_averages': {}}
+
+    for habit_id, completed, total in models.habit_rollup_totals(habit_names):
+        if total:
+            stats['habit_completion_rates'][habit_names[habit_id]] = {
+                'completed': completed,
+                'total': total,
+                'rate': round((completed / total) * 100, 2)
+            }
+
+    for measurable_id, entries, total, highest, lowest in models.measurable_rollup_totals(measurable_names):
+        if entries:
+            stats['measurable_averages'][measurable_names[measurable_id]] = {
+                'average': round(total / entries, 2),
+                'total_entries': entries,
+                'highest': highest,
+                'lowest': lowest
             }
+    return stats
+
+def iter_export(user_id, username):
+    # Yields (kind, record) in document order. Log rows are read once, ordered
+    # by owner, and each habit/measurable record carries a lazy `logs` iterator
+    # that must be consumed before the next record is requested. Statistics
+    # come from the monthly rollups and are yielded last.
+    habits, measurables = definitions.get(user_id)
+    yield 'export_info', {
+        'export_date': datetime.now().isoformat(),
+        'user': username,
+        'total_habits': len(habits),
+        'total_measurables': len(measurables),
+        'total_journal_entries': models.journal_count(user_id)
+    }
+
+    for h, rows in merge_logs(habits, models.export_habit_logs(user_id, EXPORT_BATCH_SIZE)):
+        yield 'habit', {
+            'id': h.id,
+            'name': h.name,
+            'type': h.type,
+            'question': h.question,
+            'notes': h.notes,
+            'color': h.color,
+            'logs': ({'date': log_date, 'value': value} for _, log_date, value in rows)
         }
 
-        # Calculate habit completion rates
-        for habit in habits:
-            logs = [log for log in habit_logs if log.habit_id == habit.id]
-            if logs:
-                completed = sum(1 for log in logs if log.value)
-                total = len(logs)
-                export_data['statistics']['habit_completion_rates'][habit.name] = {
-                    'completed': completed,
-                    'total': total,
-                    'rate': round((completed / total) * 100, 2) if total > 0 else 0
-                }
-
-        # Calculate measurable averages
-        for measurable in measurables:
-            logs = [log for log in measurable_logs if log.measurable_id == measurable.id and log.value]
-            if logs:
-                avg = sum(log.value for log in logs) / len(logs)
-                export_data['statistics']['measurable_averages'][measurable.name] = {
-                    'average': round(avg, 2),
-                    'total_entries': len(logs),
-                    'highest': max(log.value for log in logs),
-                    'lowest': min(log.value for log in logs)
-                }
-
-        return jsonify(export_data)
+    for m, rows in merge_logs(measurables, models.export_measurable_logs(user_id, EXPORT_BATCH_SIZE)):
+        yield 'measurable', {
+            'id': m.id,
+            'name': m.name,
+            'question': m.question,
+            'unit_target': m.unit_target,
+            'target_type': m.target_type,
+            'notes': m.notes,
+            'color': m.color,
+            'logs': ({'date': log_date, 'value': value} for _, log_date, value in rows)
+        }
+
+    for journal_date, content in models.export_journals(user_id, EXPORT_BATCH_SIZE):
+        yield 'journal', {'date': journal_date, 'content': content}
+
+    yield 'statistics', export_statistics(habits, measurables)
+
+def collect_export(records):
+    export_data = {section: [] for section in EXPORT_SECTIONS.values()}
+    for kind, record in records:
+        if kind in EXPORT_SECTIONS:
+            if 'logs' in record:
+                record['logs'] = list(record['logs'])
+            export_data[EXPORT_SECTIONS[kind]].append(record)
+        else:
+            export_data[kind] = record
+    return export_data
+
+def stream_export_json(records):
+    order = ['export_info', 'habits', 'measurables', 'journals', 'statistics']
+    position = -1
+    first_item = True
+    yield '{'
+    for kind, record in records:
+        target = EXPORT_SECTIONS.get(kind, kind)
+        if target != order[position]:
+            if order[position] in EXPORT_SECTIONS.values():
+                yield ']'
+            # Sections without any records still appear, as empty lists
+            for skipped in order[position + 1:order.index(target)]:
+                yield f', {json.dumps(skipped)}: []'
+            yield (', ' if position >= 0 else '') + json.dumps(target) + ': '
+            position = order.index(target)
+            first_item = True
+        if kind not in EXPORT_SECTIONS:
+            yield json.dumps(record)
+            continue
+
+        prefix = '[' if first_item else ', '
+        first_item = False
+        logs = record.pop('logs', None)
+        if logs is None:
+            yield prefix + json.dumps(record)
+            continue
+
+        # Emit the record without its closing brace, then its logs in batches
+        yield prefix + json.dumps(record)[:-1] + ', "logs": ['
+        batch = []
+        separator = ''
+        for log in logs:
+            batch.append(json.dumps(log))
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield separator + ', '.join(batch)
+                separator = ', '
+                batch = []
+        if batch:
+            yield separator + ', '.join(batch)
+        yield ']}'
+    yield '}\n'
+
+def stream_export_ndjson(records):
+    for kind, record in records:
+        logs = record.pop('logs', None) if kind in EXPORT_SECTIONS else None
+        yield json.dumps({'kind': kind, **record}) + '\n'
+        if logs is None:
+            continue
+        owner_key = f'{kind}_id'
+        batch = []
+        for log in logs:
+            batch.append(json.dumps({'kind': f'{kind}_log', owner_key: record['id'], **log}) + '\n')
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield ''.join(batch)
+                batch = []
+        if batch:
+            yield ''.join(batch)
+
+@bp.route('/api/export/json')
+@read_only
+@conditional_on_data_version
+def export_json():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    user_id = session['user_id']
+    username = session.get('username', 'Unknown')
+    export_format = request.args.get('format', 'json')
+    compress = request.args.get('compress')
+    error = compression_error(compress)
+    if error:
+        return error
+
+    # Streaming modes write the document while it is generated
+    if export_format == 'ndjson':
+        return export_stream_response(stream_export_ndjson(iter_export(user_id, username)),
+                                      'ndjson', 'application/x-ndjson', compress)
+    if request.args.get('stream') or compress:
+        return export_stream_response(stream_export_json(iter_export(user_id, username)),
+                                      'json', 'application/json', compress)
+
+    try:
+        return jsonify(collect_export(iter_export(user_id, username)))
     except Exception as e:
         print(f"JSON export error: {str(e)}")
         return jsonify({'error': f'JSON export failed: {str(e)}'}), 500
 
-@app.route('/api/export/excel')
+def compression_error(compress):
+    if compress and compress not in COMPRESSION:
+        return jsonify({'error': f'Unknown compression: {compress}'}), 400
+    if compress == 'zstd' and not ZSTD_AVAILABLE:
+        return jsonify({'error': 'zstd compression not available. Please install zstandard using: pip install zstandard'}), 500
+    return None
+
+def export_stream_response(chunks, extension, mimetype, compress=None):
+    # Compressed downloads are compressed chunk by chunk as the export is generated
+    filename = f'habit-analysis-{date.today().isoformat()}.{extension}'
+    if compress:
+        suffix, mimetype = COMPRESSION[compress]
+        chunks = iter_compressed(chunks, compress)
+        filename = f'{filename}.{suffix}'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+# Flat per-table exports for analytics tools: table -> (columns with Arrow
+# types, rows(user_id)). Log tables carry the day ordinal next to the date.
+EXPORT_TABLES = {
+    'habits': (
+        [('id', 'int64'), ('name', 'string'), ('type', 'string'), ('question', 'string'), ('notes', 'string'),
+         ('color', 'string')],
+        lambda user_id: definitions.habits(user_id)
+    ),
+    'measurables': (
+        [('id', 'int64'), ('name', 'string'), ('question', 'string'), ('unit_target', 'string'),
+         ('target_type', 'string'), ('notes', 'string'), ('color', 'string')],
+        lambda user_id: definitions.measurables(user_id)
+    ),
+    'habit_logs': (
+        [('habit_id', 'int64'), ('day', 'int32'), ('date', 'string'), ('value', 'bool')],
+        lambda user_id: models.habit_log_table(user_id, EXPORT_BATCH_SIZE)
+    ),
+    'measurable_logs': (
+        [('measurable_id', 'int64'), ('day', 'int32'), ('date', 'string'), ('value', 'float64')],
+        lambda user_id: models.measurable_log_table(user_id, EXPORT_BATCH_SIZE)
+    ),
+    'journals': (
+        [('day', 'int32'), ('date', 'string'), ('content', 'string')],
+        lambda user_id: models.journal_table(user_id, EXPORT_BATCH_SIZE)
+    ),
+    # Written by `flask recompute-stats`
+    'habit_stats': (
+        [('habit_id', 'int64'), ('first_day', 'int32'), ('last_day', 'int32'), ('logged_days', 'int64'),
+         ('completed_days', 'int64'), ('completion_rate', 'float64'), ('computed_version', 'int64')],
+        lambda user_id: models.habit_stats_table(user_id, EXPORT_BATCH_SIZE)
+    ),
+    'measurable_stats': (
+        [('measurable_id', 'int64'), ('first_day', 'int32'), ('last_day', 'int32'), ('logged_days', 'int64'),
+         ('entries', 'int64'), ('total', 'float64'), ('average', 'float64'), ('minimum', 'float64'),
+         ('maximum', 'float64'), ('computed_version', 'int64')],
+        lambda user_id: models.measurable_stats_table(user_id, EXPORT_BATCH_SIZE)
+    ),
+}
+EXPORT_TABLE_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+@bp.route('/api/export/tables/<table>')
+@read_only
+@conditional_on_data_version
+def export_table(table):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': f"Unknown table: {table}. Choose one of {', '.join(EXPORT_TABLES)}"}), 404
+
+    export_format = request.args.get('format', 'csv')
+    compress = request.args.get('compress')
+    if export_format not in EXPORT_TABLE_FORMATS:
+        return jsonify({'error': f'Unknown export format: {export_format}'}), 400
+    if export_format != 'csv' and not ARROW_AVAILABLE:
+        return jsonify({'error': 'Parquet export not available. Please install pyarrow using: pip install pyarrow'}), 500
+    if export_format != 'csv' and compress:
+        return jsonify({'error': 'Parquet and Arrow exports are not compressed again'}), 400
+    error = compression_error(compress)
+    if error:
+        return error
+
+    columns, rows = EXPORT_TABLES[table]
+    if export_format == 'csv':
+        chunks = iter_csv([name for name, _ in columns], rows(session['user_id']))
+    else:
+        chunks = iter_arrow(columns, rows(session['user_id']), export_format)
+    extension, mimetype = EXPORT_TABLE_FORMATS[export_format]
+    return export_stream_response(chunks, f'{table}.{extension}', mimetype, compress)
+
+EXCEL_SPOOL_SIZE = 8 * 1024 * 1024
+EXCEL_MAX_COLUMN_WIDTH = 50
+JOURNAL_EXCEL_LIMIT = 500
+
+class ColumnWidths:
+    # Tracks the widest value per column as rows are written, so sheets
+    # never need a second walk over their cells
+    def __init__(self):
+        self.widths = {}
+
+    def track(self, row):
+        for index, value in enumerate(row, 1):
+            length = len(str(value)) if value is not None else 0
+            if length > self.widths.get(index, 0):
+                self.widths[index] = length
+        return row
+
+    def apply(self, ws):
+        for index, length in self.widths.items():
+            ws.column_dimensions[get_column_letter(index)].width = min(length + 2, EXCEL_MAX_COLUMN_WIDTH)
+
+def _truncate_journal(content):
+    # Limit content length for Excel compatibility
+    content = content or ""
+    if len(content) > JOURNAL_EXCEL_LIMIT:
+        content = content[:JOURNAL_EXCEL_LIMIT] + "... (truncated)"
+    return content
+
+def _excel_export_rows(user_id):
+    # (section, header, rows) for every part of the export; log rows resolve
+    # names through preloaded id -> name maps and are read with yield_per
+    habits, measurables = definitions.get(user_id)
+    habit_names = {h.id: h.name for h in habits}
+    measurable_names = {m.id: m.name for m in measurables}
+
+    habit_logs = models.export_habit_logs(user_id, EXPORT_BATCH_SIZE)
+    measurable_logs = models.export_measurable_logs(user_id, EXPORT_BATCH_SIZE)
+    journals = models.export_journals(user_id, EXPORT_BATCH_SIZE)
+
+    return [
+        ("Habits", ["Habit Name", "Type", "Question", "Notes", "Color"],
+         ([h.name or "", h.type or "", h.question or "", h.notes or "", h.color or ""] for h in habits)),
+        ("Habit Logs", ["Habit Name", "Date", "Completed"],
+         ([habit_names[habit_id], log_date, "Yes" if value else "No"]
+          for habit_id, log_date, value in habit_logs)),
+        ("Measurables", ["Measurable Name", "Question", "Unit Target", "Target Type", "Notes", "Color"],
+         ([m.name or "", m.question or "", m.unit_target or "", m.target_type or "", m.notes or "", m.color or ""]
+          for m in measurables)),
+        ("Measurable Logs", ["Measurable Name", "Date", "Value"],
+         ([measurable_names[measurable_id], log_date, value if value is not None else 0]
+          for measurable_id, log_date, value in measurable_logs)),
+        ("Journals", ["Date", "Content"],
+         ([journal_date, _truncate_journal(content)] for journal_date, content in journals)),
+    ], habits, measurables
+
+def build_excel_workbook(user_id, username):
+    # Single "Habit Data Export" sheet, widths tracked while appending
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Habit Data Export"
+    widths = ColumnWidths()
+
+    # Add summary info
+    ws.append(widths.track(["Habit Tracker Data Export"]))
+    ws.append(widths.track(["Export Date:", datetime.now().strftime("%Y-%m-%d %H:%M:%S")]))
+    ws.append(widths.track(["User:", username]))
+
+    sections, _, _ = _excel_export_rows(user_id)
+    for title, header, rows in sections:
+        first = next(rows, None)
+        if title == "Journals" and first is None:
+            continue
+        ws.append([])  # Empty row
+        ws.append(widths.track([f"=== {title.upper()} ==="]))
+        ws.append(widths.track(header))
+        if first is not None:
+            ws.append(widths.track(first))
+        for row in rows:
+            ws.append(widths.track(row))
+
+    widths.apply(ws)
+    return wb
+
+def build_excel_workbook_streaming(user_id, username, track=None):
+    # Write-only workbook with one sheet per table. Rows are serialised as they
+    # are appended, so column widths have to be known before the first row:
+    # they come from the preloaded definitions and the fixed log formats.
+    # `track` wraps each sheet's row iterator (used for job progress).
+    wb = openpyxl.Workbook(write_only=True)
+    sections, habits, measurables = _excel_export_rows(user_id)
+
+    summary = wb.create_sheet("Summary")
+    summary_rows = [
+        ["Habit Tracker Data Export"],
+        ["Export Date:", datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
+        ["User:", username],
+    ]
+    widths = ColumnWidths()
+    for row in summary_rows:
+        widths.track(row)
+    widths.apply(summary)
+    for row in summary_rows:
+        summary.append(row)
+
+    longest_journal = db.session.query(
+        db.func.max(db.func.length(db.func.substr(Journal.content, 1, JOURNAL_EXCEL_LIMIT)))
+    ).filter(Journal.user_id == user_id).scalar() or 0
+    known_rows = {
+        "Habit Logs": [[h.name, "YYYY-MM-DD", "Yes"] for h in habits],
+        "Measurable Logs": [[m.name, "YYYY-MM-DD", "0000000.00"] for m in measurables],
+        "Journals": [["YYYY-MM-DD", "x" * longest_journal]],
+    }
+
+    for title, header, rows in sections:
+        ws = wb.create_sheet(title)
+        widths = ColumnWidths()
+        widths.track(header)
+        if title not in known_rows:
+            # Definition sheets are small and already loaded
+            rows = [widths.track(row) for row in rows]
+        for row in known_rows.get(title, ()):
+            widths.track(row)
+        widths.apply(ws)
+        ws.append(header)
+        for row in (track(rows) if track else rows):
+            ws.append(row)
+    return wb
+
+@bp.route('/api/export/excel')
+@read_only
+@conditional_on_data_version
 def export_excel():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
@@ -630,139 +1882,456 @@ def export_excel():
 
     try:
         user_id = session['user_id']
+        username = session.get('username', 'Unknown')
 
-        # Create simple workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Habit Data Export"
-
-        # Add summary info
-        ws.append(["Habit Tracker Data Export"])
-        ws.append(["Export Date:", datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
-        ws.append(["User:", session.get('username', 'Unknown')])
-        ws.append([])  # Empty row
-
-        # Habits section
-        ws.append(["=== HABITS ==="])
-        ws.append(["Habit Name", "Type", "Question", "Notes", "Color"])
-
-        habits = Habit.query.filter_by(user_id=user_id).all()
-        for habit in habits:
-            ws.append([
-                habit.name or "",
-                habit.type or "",
-                habit.question or "",
-                habit.notes or "",
-                habit.color or ""
-            ])
-
-        ws.append([])  # Empty row
-
-        # Habit logs section
-        ws.append(["=== HABIT LOGS ==="])
-        ws.append(["Habit Name", "Date", "Completed"])
-
-        habit_logs = db.session.query(HabitLog).join(Habit).filter(Habit.user_id == user_id).all()
-        for log in habit_logs:
-            habit = Habit.query.get(log.habit_id)
-            if habit:
-                ws.append([
-                    habit.name,
-                    log.date,
-                    "Yes" if log.value else "No"
-                ])
-
-        ws.append([])  # Empty row
+        if request.args.get('stream'):
+            wb = build_excel_workbook_streaming(user_id, username)
+        else:
+            wb = build_excel_workbook(user_id, username)
 
-        # Measurables section
-        ws.append(["=== MEASURABLES ==="])
-        ws.append(["Measurable Name", "Question", "Unit Target", "Target Type", "Notes", "Color"])
-
-        measurables = Measurable.query.filter_by(user_id=user_id).all()
-        for measurable in measurables:
-            ws.append([
-                measurable.name or "",
-                measurable.question or "",
-                measurable.unit_target or "",
-                measurable.target_type or "",
-                measurable.notes or "",
-                measurable.color or ""
-            ])
+        # Spool to disk past EXCEL_SPOOL_SIZE and send the file in chunks
+        output = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_SIZE)
+        wb.save(output)
+        output.seek(0)
 
-        ws.append([])  # Empty row
+        return send_file(
+            output,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=f'habit-analysis-{date.today().isoformat()}.xlsx'
+        )
 
-        # Measurable logs section
-        ws.append(["=== MEASURABLE LOGS ==="])
-        ws.append(["Measurable Name", "Date", "Value"])
+    except Exception as e:
+        print(f"Excel export error: {str(e)}")
+        return jsonify({'error': f'Excel export failed: {str(e)}'}), 500
 
-        measurable_logs = db.session.query(MeasurableLog).join(Measurable).filter(Measurable.user_id == user_id).all()
-        for log in measurable_logs:
-            measurable = Measurable.query.get(log.measurable_id)
-            if measurable:
-                ws.append([
-                    measurable.name,
-                    log.date,
-                    log.value if log.value is not None else 0
-                ])
+# ------------------ Export Jobs ------------------
+# Exports for large accounts run on a bounded background pool; the browser
+# polls the job and downloads the finished file from the artifact directory.
+EXPORT_JOB_FORMATS = {
+    'json': ('json', 'application/json'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'ndjson_gzip': ('ndjson.gz', 'application/gzip'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+def export_row_count(user_id):
+    # Definitions, logs and journal entries: the units job progress is counted in
+    counts = [
+        db.session.query(db.func.count(Habit.id)).filter(Habit.user_id == user_id),
+        db.session.query(db.func.count(HabitLog.id)).join(Habit).filter(Habit.user_id == user_id),
+        db.session.query(db.func.count(Measurable.id)).filter(Measurable.user_id == user_id),
+        db.session.query(db.func.count(MeasurableLog.id)).join(Measurable).filter(Measurable.user_id == user_id),
+        db.session.query(db.func.count(Journal.id)).filter(Journal.user_id == user_id),
+    ]
+    return sum(query.scalar() for query in counts)
+
+def track_export(records, job):
+    # Counts every definition, log and journal entry as the writer consumes it
+    for kind, record in records:
+        if kind in EXPORT_SECTIONS:
+            job.advance()
+            if 'logs' in record:
+                record['logs'] = job.track(record['logs'])
+        yield kind, record
+
+def export_job_builder(export_format, user_id, username):
+    app = current_app._get_current_object()
+
+    def build(job, path):
+        with app.app_context():
+            g.read_only = True
+            job.total = export_row_count(user_id)
+            if export_format == 'excel':
+                build_excel_workbook_streaming(user_id, username, track=job.track).save(path)
+                return
+            records = track_export(iter_export(user_id, username), job)
+            if export_format == 'ndjson_gzip':
+                with open(path, 'wb') as f:
+                    f.writelines(iter_compressed(stream_export_ndjson(records), 'gzip'))
+                return
+            writer = stream_export_ndjson if export_format == 'ndjson' else stream_export_json
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(writer(records))
+    return build
+
+def export_job_response(job):
+    data = job.to_dict()
+    data['status_url'] = url_for('main.export_job_status', job_id=job.id)
+    data['download_url'] = url_for('main.export_job_download', job_id=job.id) if job.status == 'done' else None
+    return data
+
+@bp.route('/api/export/jobs', methods=['POST'])
+def create_export_job():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
 
-        ws.append([])  # Empty row
+    payload = request.get_json(silent=True) or request.form
+    export_format = payload.get('format', 'json')
+    if export_format not in EXPORT_JOB_FORMATS:
+        return jsonify({'error': f'Unknown export format: {export_format}'}), 400
+    if export_format == 'excel' and not EXCEL_AVAILABLE:
+        return jsonify({'error': 'Excel export not available. Please install openpyxl using: pip install openpyxl'}), 500
 
-        # Journals section
-        journals = Journal.query.filter_by(user_id=user_id).all()
-        if journals:
-            ws.append(["=== JOURNALS ==="])
-            ws.append(["Date", "Content"])
-
-            for journal in journals:
-                # Limit content length for Excel compatibility
-                content = journal.content or ""
-                if len(content) > 500:
-                    content = content[:500] + "... (truncated)"
-
-                ws.append([
-                    journal.date,
-                    content
-                ])
-
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-
-            for cell in column:
-                try:
-                    cell_value = str(cell.value) if cell.value is not None else ""
-                    if len(cell_value) > max_length:
-                        max_length = len(cell_value)
-                except:
-                    pass
-
-            # Set width (max 50 characters)
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        # Save to memory
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+    user_id = session['user_id']
+    username = session.get('username', 'Unknown')
+    extension, mimetype = EXPORT_JOB_FORMATS[export_format]
+    filename = f'habit-analysis-{date.today().isoformat()}.{extension}'
+    try:
+        job, created = current_app.extensions['export_jobs'].submit(user_id, export_format, filename, mimetype,
+                                          export_job_builder(export_format, user_id, username))
+    except QueueFull:
+        response = jsonify({'error': 'Too many exports in progress, try again shortly'})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+    return jsonify(export_job_response(job)), 202 if created else 200
+
+@bp.route('/api/export/jobs/<job_id>')
+def export_job_status(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    job = current_app.extensions['export_jobs'].get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Export not found'}), 404
+    return jsonify(export_job_response(job))
 
-        response = make_response(output.read())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename=habit-analysis-{date.today().isoformat()}.xlsx'
+@bp.route('/api/export/jobs/<job_id>/download')
+def export_job_download(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    job = current_app.extensions['export_jobs'].get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Export not found'}), 404
+    if job.status != 'done':
+        return jsonify({'error': f'Export is {job.status}'}), 409
+    return send_file(job.path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+
+# ------------------ Import ------------------
+# Restores the JSON export document, NDJSON export or a Loop Habit Tracker
+# style CSV into one account. Definitions are matched by name (or created),
+# rows are upserted in executemany batches and committed in chunks, and the
+# derived tables and caches are refreshed once at the end.
+IMPORT_BATCH_SIZE = 1000
+IMPORT_COMMIT_ROWS = 20000
+IMPORT_MAX_ERRORS = 50  # error messages kept in the summary; all are counted
+
+def record_text(record, key, default=None):
+    # Text columns accept strings and numbers; nested JSON fails that record
+    value = record.get(key)
+    if value is None or value == '':
+        return default
+    if isinstance(value, (dict, list)):
+        raise ValueError(f'{key} must be text, not {type(value).__name__}')
+    return str(value)
+
+class ImportRun:
+    def __init__(self, user_id, dry_run=False, progress=None):
+        self.user_id = user_id
+        self.dry_run = dry_run
+        self.progress = progress
+        habits, measurables = load_definitions(user_id)
+        self.habits_by_name = {h.name: h.id for h in habits}
+        self.measurables_by_name = {m.name: m.id for m in measurables}
+        self.owner_ids = {'habit': {}, 'measurable': {}}  # source id -> id in this account
+        self.pending = {'habit_log': [], 'measurable_log': [], 'journal': []}
+        self.touched_habits = set()
+        self.touched_measurables = set()
+        self.counts = defaultdict(int)
+        self.errors = []
+        self.uncommitted = 0
+
+    def error(self, message):
+        self.counts['errors'] += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(message)
+
+    def add(self, kind, record):
+        try:
+            if kind == 'habit':
+                self._definition('habit', record)
+            elif kind == 'measurable':
+                self._definition('measurable', record)
+            elif kind in ('habit_log', 'measurable_log'):
+                self._log(kind, record)
+            elif kind == 'journal':
+                day = parse_day(str(record['date']))
+                self._queue('journal', {'user_id': self.user_id, 'date': day.isoformat(), 'day': day.toordinal(),
+                                        'content': record_text(record, 'content', '')})
+            elif kind == 'invalid':
+                self.error(record['error'])
+            else:
+                self.counts['skipped'] += 1  # export_info, statistics
+        except (KeyError, TypeError, ValueError) as e:
+            self.error(f'{kind}: {e.__class__.__name__} {e}')
+
+    def _definition(self, kind, record):
+        name = (record_text(record, 'name') or '').strip()
+        if not name:
+            raise ValueError('definition without a name')
+        by_name = self.habits_by_name if kind == 'habit' else self.measurables_by_name
+        target = by_name.get(name)
+        if target is not None:
+            self.counts[f'{kind}s_matched'] += 1
+        else:
+            if kind == 'habit':
+                model, values = Habit, {'type': record_text(record, 'type', 'yesno')}
+            else:
+                model, values = Measurable, {'unit_target': record_text(record, 'unit_target', ''),
+                                             'target_type': record_text(record, 'target_type', 'Atleast')}
+            values.update(user_id=self.user_id, name=name, question=record_text(record, 'question'),
+                          notes=record_text(record, 'notes'), color=record_text(record, 'color'))
+            if self.dry_run:
+                target = -(len(by_name) + 1)
+            else:
+                target = db.session.execute(db.insert(model).values(**values)).inserted_primary_key[0]
+            by_name[name] = target
+            self.counts[f'{kind}s_created'] += 1
+        self.owner_ids[kind][record.get('id', name)] = target
+
+    def _log(self, kind, record):
+        owner = kind[:-len('_log')]
+        target = self.owner_ids[owner].get(record.get(f'{owner}_id'))
+        if target is None:
+            raise ValueError(f"log for unknown {owner} {record.get(f'{owner}_id')!r}")
+        day = parse_day(str(record['date']))
+        value = record.get('value')
+        if owner == 'habit':
+            value = value if isinstance(value, bool) else str(value).strip().lower() in ('1', 'true', 'yes')
+            self.touched_habits.add(target)
+        else:
+            value = float(value or 0)
+            self.touched_measurables.add(target)
+        self._queue(kind, {f'{owner}_id': target, 'date': day.isoformat(), 'day': day.toordinal(), 'value': value})
+
+    def _queue(self, kind, row):
+        self.pending[kind].append(row)
+        if len(self.pending[kind]) >= IMPORT_BATCH_SIZE:
+            self._flush(kind)
+
+    def _flush(self, kind):
+        rows = self.pending[kind]
+        if not rows:
+            return
+        if not self.dry_run:
+            {'habit_log': upsert_habit_logs, 'measurable_log': upsert_measurable_logs,
+             'journal': upsert_journals}[kind](rows)
+            self.uncommitted += len(rows)
+        self.counts[f'{kind}s'] += len(rows)
+        self.pending[kind] = []
+        if self.uncommitted >= IMPORT_COMMIT_ROWS:
+            db.session.commit()
+            self.uncommitted = 0
+        if self.progress:
+            self.progress(self.counts)
+
+    def finish(self):
+        for kind in self.pending:
+            self._flush(kind)
+        if not self.dry_run:
+            self.refresh()
+        return {'dry_run': self.dry_run, 'counts': dict(self.counts), 'errors': self.errors}
+
+    def refresh(self):
+        # Streaks, rollups and caches for everything written so far; also used after a failed import
+        if self.touched_habits:
+            recompute_streaks(sorted(self.touched_habits))
+        rebuild_rollups(sorted(self.touched_habits), sorted(self.touched_measurables))
+        bumped = bump_data_version(user_id=self.user_id)
+        db.session.commit()
+        habit_bitmaps.invalidate_many(self.touched_habits)
+        definitions.invalidate(self.user_id)
+        invalidate_badges(self.user_id)
+        note_local_write(bumped)
+
+def run_import(user_id, stream, import_format, dry_run=False, progress=None):
+    # `stream` is a text stream; raises ImportFormatError when the input cannot be read at all
+    run = ImportRun(user_id, dry_run=dry_run, progress=progress)
+    try:
+        for kind, record in READERS[import_format](stream):
+            run.add(kind, record)
+        return run.finish()
+    except Exception:
+        db.session.rollback()
+        if not dry_run:
+            run.refresh()
+        raise
+
+@bp.route('/api/import', methods=['POST'])
+def import_data():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
 
-        return response
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'No file uploaded'}), 400
+    import_format = request.form.get('format') or detect_format(upload.filename)
+    if import_format not in READERS:
+        return jsonify({'error': f'Unknown import format: {import_format}'}), 400
 
-    except Exception as e:
-        print(f"Excel export error: {str(e)}")
-        return jsonify({'error': f'Excel export failed: {str(e)}'}), 500
+    # Werkzeug spools large uploads to disk; the file is decoded as it is read
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='' if import_format == 'csv' else None)
+    try:
+        summary = run_import(session['user_id'], stream, import_format, dry_run=bool(request.form.get('dry_run')))
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Import failed: {e}'}), 400
+    return jsonify(summary)
+
+@bp.cli.command('import-data')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Account to import into.')
+@click.option('--format', 'import_format', type=click.Choice(sorted(READERS)), help='Defaults to the file extension.')
+@click.option('--dry-run', is_flag=True, help='Validate the file without writing anything.')
+def import_data_command(path, username, import_format, dry_run):
+    """Import an export document, NDJSON export or Loop Habit Tracker CSV."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username}')
+    import_format = import_format or detect_format(path)
+
+    def progress(counts):
+        rows = sum(counts[key] for key in ('habit_logs', 'measurable_logs', 'journals'))
+        click.echo(f'\r{rows} rows, {counts["errors"]} errors', nl=False)
+
+    with open(path, encoding='utf-8-sig', newline='' if import_format == 'csv' else None) as f:
+        try:
+            summary = run_import(user.id, f, import_format, dry_run=dry_run, progress=progress)
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            raise click.ClickException(str(e))
+    click.echo()
+    click.echo(json.dumps(summary, indent=2))
+
+# ------------------ Stats Job ------------------
+# `flask recompute-stats` rebuilds streaks, monthly rollups and the all-time
+# stats tables of every user. Users are sharded over a process pool; a shard
+# reads its logs in one ordered pass per table, then replaces its derived rows
+# and writes its checkpoint in one transaction, so --resume picks up after
+# the last finished shard. If a user writes while their shard is computed,
+# the shard is computed again rather than overwriting newer rows.
+STATS_SHARD_USERS = 50
+STATS_SHARD_ATTEMPTS = 3
+
+def compute_user_stats(user_ids):
+    versions = dict(db.session.execute(db.select(User.id, User.data_version).where(User.id.in_(user_ids))).all())
+    habits = db.session.execute(db.select(Habit.id, Habit.user_id).where(
+        Habit.user_id.in_(user_ids)).order_by(Habit.id)).all()
+    measurables = db.session.execute(db.select(Measurable.id, Measurable.user_id).where(
+        Measurable.user_id.in_(user_ids)).order_by(Measurable.id)).all()
+
+    results = {HabitStreak: [], HabitMonthRollup: [], HabitStats: [], MeasurableMonthRollup: [], MeasurableStats: []}
+    logs = 0
+    for habit, rows in merge_logs(habits, models.shard_habit_logs(user_ids, EXPORT_BATCH_SIZE)):
+        rows = [(day, value) for _, day, value in rows]
+        streak, rollups, stats = stats_job.habit_aggregates(habit.id, rows)
+        if streak:
+            results[HabitStreak].append(streak)
+        results[HabitMonthRollup].extend(rollups)
+        results[HabitStats].append({**stats, 'computed_version': versions[habit.user_id]})
+        logs += len(rows)
+    for measurable, rows in merge_logs(measurables, models.shard_measurable_logs(user_ids, EXPORT_BATCH_SIZE)):
+        rows = [(day, value) for _, day, value in rows]
+        rollups, stats = stats_job.measurable_aggregates(measurable.id, rows)
+        results[MeasurableMonthRollup].extend(rollups)
+        results[MeasurableStats].append({**stats, 'computed_version': versions[measurable.user_id]})
+        logs += len(rows)
+    counts = {'habits': len(habits), 'measurables': len(measurables), 'logs': logs}
+    return versions, results, counts
+
+def recompute_user_stats(user_ids, run_id=None):
+    habit_ids = db.select(Habit.id).where(Habit.user_id.in_(user_ids))
+    measurable_ids = db.select(Measurable.id).where(Measurable.user_id.in_(user_ids))
+    owners = {
+        HabitStreak: HabitStreak.habit_id.in_(habit_ids),
+        HabitMonthRollup: HabitMonthRollup.habit_id.in_(habit_ids),
+        HabitStats: HabitStats.habit_id.in_(habit_ids),
+        MeasurableMonthRollup: MeasurableMonthRollup.measurable_id.in_(measurable_ids),
+        MeasurableStats: MeasurableStats.measurable_id.in_(measurable_ids),
+    }
+
+    for _ in range(STATS_SHARD_ATTEMPTS):
+        versions, results, counts = compute_user_stats(user_ids)
+        # End the read snapshot first: the deletes below then wait for the write
+        # lock instead of failing on a snapshot another writer has moved past
+        db.session.commit()
+        for model, where in owners.items():
+            db.session.execute(db.delete(model).where(where))
+        current = dict(db.session.execute(db.select(User.id, User.data_version).where(User.id.in_(user_ids))).all())
+        if current != versions:
+            db.session.rollback()
+            continue
+        for model, rows in results.items():
+            if rows:
+                db.session.execute(db.insert(model), rows)
+        if run_id:
+            db.session.execute(db.insert(StatsCheckpoint), [{'run_id': run_id, 'user_id': u} for u in user_ids])
+        db.session.commit()
+        return counts
+    # Left without a checkpoint, so a resumed run tries these users again
+    return {'skipped_users': len(user_ids)}
+
+_stats_worker_app = None
+
+def _stats_worker_init(config):
+    global _stats_worker_app
+    _stats_worker_app = create_app(config)
+
+def _stats_worker(user_ids, run_id):
+    with _stats_worker_app.app_context():
+        return recompute_user_stats(user_ids, run_id)
+
+@bp.cli.command('recompute-stats')
+@click.option('--processes', type=int, default=os.cpu_count() or 1, show_default=True,
+              help='Worker processes; 1 runs everything in this process.')
+@click.option('--shard-size', type=int, default=STATS_SHARD_USERS, show_default=True, help='Users per shard.')
+@click.option('--resume', is_flag=True, help='Continue the latest run instead of starting a new one.')
+def recompute_stats_command(processes, shard_size, resume):
+    """Recompute streaks, monthly rollups and all-time stats for every user."""
+    init_db()
+    if resume:
+        run_id = db.session.execute(db.select(db.func.max(StatsCheckpoint.run_id))).scalar()
+        if run_id is None:
+            raise click.ClickException('No run to resume')
+    else:
+        run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+        db.session.execute(db.delete(StatsCheckpoint))
+        db.session.commit()
 
-@app.route('/logout')
+    finished = db.select(StatsCheckpoint.user_id).where(StatsCheckpoint.run_id == run_id)
+    user_ids = db.session.execute(db.select(User.id).where(User.id.not_in(finished)).order_by(User.id)).scalars().all()
+    if not user_ids:
+        click.echo(f'Run {run_id} is already complete')
+        return
+
+    # An in-memory database is private to this process
+    if str(db.engine.url) in ('sqlite://', 'sqlite:///:memory:'):
+        processes = 1
+    processes = max(1, min(processes, -(-len(user_ids) // shard_size)))
+    if processes == 1:
+        worker, initializer, initargs = functools.partial(recompute_user_stats, run_id=run_id), None, ()
+    else:
+        config = {'SQLALCHEMY_DATABASE_URI': db.engine.url.render_as_string(hide_password=False),
+                  'PASSWORD_HASH_BACKEND': 'inline', 'DB_READ_POOL_SIZE': 0, 'DB_AUTO_MIGRATE': False}
+        worker, initializer, initargs = functools.partial(_stats_worker, run_id=run_id), _stats_worker_init, (config,)
+    db.session.remove()
+
+    def progress(totals, elapsed):
+        click.echo(f"\r{totals['users']}/{len(user_ids)} users, {totals['users'] / elapsed:.1f} users/s", nl=False)
+
+    click.echo(f'Run {run_id}: {len(user_ids)} users on {processes} process(es)')
+    totals, elapsed = stats_job.run_shards(worker, stats_job.shards(user_ids, shard_size), processes,
+                                           initializer, initargs, progress)
+    click.echo()
+    click.echo(f"{totals['users']} users, {totals.get('habits', 0)} habits, {totals.get('measurables', 0)} measurables, "
+               f"{totals.get('logs', 0)} logs in {elapsed:.2f}s "
+               f"({totals['users'] / elapsed:.1f} users/s, {totals.get('logs', 0) / elapsed:.0f} logs/s)")
+    if totals.get('skipped_users'):
+        click.echo(f"{totals['skipped_users']} users kept changing and were skipped; run again with --resume")
+
+@bp.route('/logout')
 def logout():
     session.clear()
     flash('Logged out successfully', 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
+    app = create_app()
     app.run(debug=True, port=9000)
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import app as webapp
+from bench import data, runner
+
+# python -m bench generate --db bench.db --users 20 --years 3
+# python -m bench run --db bench.db --save baseline.json
+# python -m bench run --db bench.db --compare baseline.json
+# python -m bench run --db bench.db --url http://127.0.0.1:9000 --concurrency 8
+
+def bench_app(path):
+    return webapp.create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(path)}',
+        'PASSWORD_HASH_BACKEND': 'inline'
+    })
+
+def add_generate_options(parser):
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--habits', type=int, default=5, help='habits per user')
+    parser.add_argument('--measurables', type=int, default=3, help='measurables per user')
+    parser.add_argument('--years', type=int, default=2, help='years of daily logs')
+    parser.add_argument('--journal-rate', type=float, default=0.6, help='share of days with a journal entry')
+    parser.add_argument('--seed', type=int, default=1)
+
+def generate(path, args):
+    if os.path.exists(path):
+        raise SystemExit(f'{path} already exists')
+    app = bench_app(path)
+    with app.app_context():
+        webapp.init_db()
+        counts = data.generate(users=args.users, habits=args.habits, measurables=args.measurables,
+                               years=args.years, journal_rate=args.journal_rate, seed=args.seed)
+        webapp.db.engine.dispose()
+    print('Generated ' + ', '.join(f'{count} {table}' for table, count in counts.items()))
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Synthetic-load benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='create a benchmark database')
+    generate_parser.add_argument('--db', required=True)
+    add_generate_options(generate_parser)
+
+    run_parser = commands.add_parser('run', help='benchmark every route')
+    run_parser.add_argument('--db', help='database from "generate"; a temporary one is generated when omitted')
+    add_generate_options(run_parser)
+    run_parser.add_argument('--iterations', type=int, default=50)
+    run_parser.add_argument('--warmup', type=int, default=5)
+    run_parser.add_argument('--only', help='comma-separated scenario names')
+    run_parser.add_argument('--memory', action='store_true', help='track peak memory (slows requests down)')
+    run_parser.add_argument('--url', help='benchmark a running server instead of the test client')
+    run_parser.add_argument('--concurrency', type=int, default=4)
+    run_parser.add_argument('--save', help='write the JSON report to this file')
+    run_parser.add_argument('--compare', help='baseline JSON report to compare p95 latency with')
+    run_parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 growth, as a fraction')
+
+    commands.add_parser('list', help='list scenario names')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        print('\n'.join(s.name for s in runner.SCENARIOS))
+        return 0
+    if args.command == 'generate':
+        generate(args.db, args)
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix='habit-bench-')
+    try:
+        # Write routes change the data, so in-process runs work on a copy
+        path = os.path.join(workdir, 'bench.db')
+        if args.db:
+            shutil.copyfile(args.db, path)
+        else:
+            generate(path, args)
+
+        scenarios = runner.selected(args.only.split(',') if args.only else None)
+        settings = {key: value for key, value in vars(args).items() if key not in ('save', 'compare', 'command')}
+        app = bench_app(args.db if args.url else path)
+        with app.app_context():
+            fixture = runner.load_fixture()
+            if args.url:
+                results = runner.run_http(args.url, fixture, scenarios, args.iterations, args.warmup, args.seed,
+                                          args.concurrency)
+            else:
+                results = runner.run_in_process(fixture, scenarios, args.iterations, args.warmup, args.seed,
+                                                args.memory)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = runner.report(results, settings)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Saved {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = runner.compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} scenario(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
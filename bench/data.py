@@ -0,0 +1,97 @@
+import random
+from datetime import date, timedelta
+from flask import current_app
+import app as webapp
+from app import db
+
+# Deterministic synthetic accounts: the same parameters and seed always give the
+# same rows, so runs against regenerated databases stay comparable.
+
+BENCH_PASSWORD = 'bench'
+INSERT_BATCH_SIZE = 5000
+
+COLORS = ['#60a5fa', '#f87171', '#34d399', '#fbbf24', '#a78bfa', '#f472b6', '#22c55e', '#fb923c']
+WORDS = ('today was good bad tired productive study gym read book work meeting walk run coffee friends family '
+         'project deadline sleep early late focus learned python sql exam rest music movie cooked dinner '
+         'weather rain sunny travel plan goal progress habit streak journal notes idea').split()
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _insert(model, rows):
+    count = 0
+    for batch in _batched(rows):
+        db.session.execute(db.insert(model), batch)
+        count += len(batch)
+    return count
+
+def _days(end, years):
+    start = end - timedelta(days=365 * years - 1)
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+def generate(users=10, habits=5, measurables=3, years=2, journal_rate=0.6, log_rate=0.85, seed=1, end=None):
+    # Fills an empty, initialised database (call inside an app context). Returns row counts.
+    rng = random.Random(seed)
+    days = _days(end or date.today(), years)
+    password = current_app.extensions['password_hasher'].hash(BENCH_PASSWORD)
+
+    counts = {'users': _insert(webapp.User, (
+        {'id': user_id, 'username': f'bench{user_id}', 'password': password}
+        for user_id in range(1, users + 1)
+    ))}
+
+    habit_rows, measurable_rows = [], []
+    for user_id in range(1, users + 1):
+        for index in range(habits):
+            habit_rows.append({
+                'id': len(habit_rows) + 1, 'user_id': user_id, 'type': 'yesno', 'name': f'Habit {index + 1}',
+                'question': f'Did you do habit {index + 1} today?', 'notes': '', 'color': rng.choice(COLORS)
+            })
+        for index in range(measurables):
+            measurable_rows.append({
+                'id': len(measurable_rows) + 1, 'user_id': user_id, 'name': f'Measure {index + 1}',
+                'question': f'How much of measure {index + 1}?', 'unit_target': str(rng.randint(5, 60)),
+                'target_type': rng.choice(['Atleast', 'Atmost']), 'notes': '', 'color': rng.choice(COLORS)
+            })
+    counts['habits'] = _insert(webapp.Habit, habit_rows)
+    counts['measurables'] = _insert(webapp.Measurable, measurable_rows)
+
+    def habit_logs():
+        for habit in habit_rows:
+            rate = rng.uniform(0.3, 0.9)
+            for day in days:
+                if rng.random() < log_rate:
+                    yield {'habit_id': habit['id'], 'date': day.isoformat(), 'day': day.toordinal(),
+                           'value': rng.random() < rate}
+
+    def measurable_logs():
+        for measurable in measurable_rows:
+            target = float(measurable['unit_target'])
+            for day in days:
+                if rng.random() < log_rate:
+                    yield {'measurable_id': measurable['id'], 'date': day.isoformat(), 'day': day.toordinal(),
+                           'value': round(max(rng.gauss(target, target / 3), 0), 1)}
+
+    def journals():
+        for user_id in range(1, users + 1):
+            for day in days:
+                if rng.random() < journal_rate:
+                    content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 120)))
+                    yield {'user_id': user_id, 'date': day.isoformat(), 'day': day.toordinal(),
+                           'content': content.capitalize() + '.'}
+
+    counts['habit_logs'] = _insert(webapp.HabitLog, habit_logs())
+    counts['measurable_logs'] = _insert(webapp.MeasurableLog, measurable_logs())
+    counts['journals'] = _insert(webapp.Journal, journals())
+
+    webapp.recompute_streaks()
+    webapp.rebuild_rollups()
+    db.session.commit()
+    return counts
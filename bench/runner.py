@@ -0,0 +1,253 @@
+import http.cookiejar
+import json
+import platform
+import random
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from sqlalchemy import event
+from flask import current_app
+import app as webapp
+from app import db
+from bench.data import BENCH_PASSWORD, WORDS
+
+# Scenario.build(rng, user, fixture) -> (method, path, request kwargs)
+Scenario = namedtuple('Scenario', 'name build')
+BenchUser = namedtuple('BenchUser', 'id username habit_ids measurable_ids')
+Fixture = namedtuple('Fixture', 'users first_day last_day')
+
+def _random_date(rng, fixture):
+    return date.fromordinal(rng.randint(fixture.first_day, fixture.last_day)).isoformat()
+
+def _random_month(rng, fixture):
+    day = date.fromordinal(rng.randint(fixture.first_day, fixture.last_day))
+    return day.year, day.month
+
+def _range(rng, fixture):
+    year, month = _random_month(rng, fixture)
+    end = date(year + month // 12, month % 12 + 1, 1).toordinal() - 1
+    return f'start={year}-{month:02d}-01&end={date.fromordinal(end).isoformat()}'
+
+def _visual(kind, view):
+    def build(rng, user, fixture):
+        ids = user.habit_ids if kind == 'habit' else user.measurable_ids
+        return 'GET', f'/{kind}_visual/{rng.choice(ids)}?view={view}', {}
+    return Scenario(f'{kind}_visual_{view}', build)
+
+def _get(name, path):
+    return Scenario(name, lambda rng, user, fixture: ('GET', path(rng, fixture) if callable(path) else path, {}))
+
+SCENARIOS = [
+    _get('home', '/'),
+    _get('home_month', lambda rng, fixture: '/?year={}&month={}'.format(*_random_month(rng, fixture))),
+    _get('day_data', lambda rng, fixture: f'/day_data/{_random_date(rng, fixture)}'),
+    _get('range_data', lambda rng, fixture: f'/range_data?{_range(rng, fixture)}'),
+    Scenario('update_habit', lambda rng, user, fixture: ('POST', '/update_habit', {'data': {
+        'habit_id': rng.choice(user.habit_ids), 'date': _random_date(rng, fixture),
+        'value': rng.choice(['true', 'false'])
+    }})),
+    Scenario('update_measurable', lambda rng, user, fixture: ('POST', '/update_measurable', {'data': {
+        'measurable_id': rng.choice(user.measurable_ids), 'date': _random_date(rng, fixture),
+        'value': str(rng.randint(0, 60))
+    }})),
+    Scenario('update_day', lambda rng, user, fixture: ('POST', f'/api/day/{_random_date(rng, fixture)}', {'json': {
+        'habits': {str(h): rng.random() < 0.5 for h in user.habit_ids},
+        'measurables': {str(m): rng.randint(0, 60) for m in user.measurable_ids}
+    }})),
+    _get('habit_analysis', '/habit_analysis'),
+    _get('measurable_analysis', '/measurable_analysis'),
+    *[_visual(kind, view) for kind in ('habit', 'measurable') for view in ('week', 'month', 'year', 'all')],
+    _visual('measurable', 'quarter'),
+    _get('all_journals', '/all_journals'),
+    _get('journal_search', lambda rng, fixture: f'/journals/search?q={rng.choice(WORDS)}'),
+    _get('export_json', '/api/export/json'),
+    _get('export_json_stream', '/api/export/json?stream=1'),
+    _get('export_excel', '/api/export/excel?stream=1'),
+]
+
+def load_fixture():
+    # Users with their definition ids and the logged date range, read from the current app's database
+    users = []
+    rows = db.session.execute(db.select(webapp.User.id, webapp.User.username).order_by(webapp.User.id))
+    for user_id, username in rows.all():
+        habits, measurables = webapp.definitions.get(user_id)
+        if habits and measurables:
+            users.append(BenchUser(user_id, username, [h.id for h in habits], [m.id for m in measurables]))
+    first_day, last_day = db.session.execute(db.select(db.func.min(webapp.HabitLog.day),
+                                                       db.func.max(webapp.HabitLog.day))).one()
+    if not users or first_day is None:
+        raise SystemExit('The benchmark database has no users with habits, measurables and logs')
+    return Fixture(users, first_day, last_day)
+
+class QueryCounter:
+    def __init__(self, engines):
+        self.engines = engines
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._count)
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+def summarize(samples, wall, queries=None, peak=None, errors=0):
+    ordered = sorted(samples)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0,
+        'throughput_rps': round(len(ordered) / wall, 2) if wall else 0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'peak_memory_kb': round(max(peak) / 1024, 1) if peak else None
+    }
+
+def selected(only=None):
+    if not only:
+        return SCENARIOS
+    names = set(only)
+    unknown = names - {s.name for s in SCENARIOS}
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return [s for s in SCENARIOS if s.name in names]
+
+def run_in_process(fixture, scenarios, iterations=50, warmup=5, seed=1, memory=False):
+    # Sequential requests through the Flask test client, one random user each
+    app = current_app._get_current_object()
+    engines = [db.engine] + ([app.extensions['read_engine']] if 'read_engine' in app.extensions else [])
+    client = app.test_client()
+    rng = random.Random(seed)
+    results = {}
+    if memory:
+        tracemalloc.start()
+    try:
+        for scenario in scenarios:
+            samples, queries, peaks, errors = [], [], [], 0
+            with QueryCounter(engines) as counter:
+                for i in range(warmup + iterations):
+                    user = rng.choice(fixture.users)
+                    with client.session_transaction() as sess:
+                        sess['user_id'] = user.id
+                        sess['username'] = user.username
+                    method, path, kwargs = scenario.build(rng, user, fixture)
+                    if memory:
+                        tracemalloc.reset_peak()
+                    counter.count = 0
+                    started = time.perf_counter()
+                    response = client.open(path, method=method, **kwargs)
+                    response.get_data()
+                    elapsed = time.perf_counter() - started
+                    response.close()
+                    if i < warmup:
+                        continue
+                    errors += response.status_code >= 400
+                    samples.append(elapsed)
+                    queries.append(counter.count)
+                    if memory:
+                        peaks.append(tracemalloc.get_traced_memory()[1])
+            results[scenario.name] = summarize(samples, sum(samples), queries, peaks, errors)
+            print(f"{scenario.name:28} p50 {results[scenario.name]['p50_ms']:9.2f} ms  "
+                  f"p95 {results[scenario.name]['p95_ms']:9.2f} ms  "
+                  f"queries {results[scenario.name]['queries_per_request']}")
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return results
+
+def _login_opener(base_url, user):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    body = urllib.parse.urlencode({'username': user.username, 'password': BENCH_PASSWORD}).encode()
+    opener.open(f'{base_url}/login', data=body).read()
+    return opener
+
+def _http_request(opener, base_url, method, path, kwargs):
+    headers = {}
+    body = None
+    if 'json' in kwargs:
+        body = json.dumps(kwargs['json']).encode()
+        headers['Content-Type'] = 'application/json'
+    elif 'data' in kwargs:
+        body = urllib.parse.urlencode(kwargs['data']).encode()
+    request = urllib.request.Request(base_url + path, data=body, headers=headers, method=method)
+    started = time.perf_counter()
+    try:
+        with opener.open(request) as response:
+            response.read()
+        ok = True
+    except urllib.error.HTTPError:
+        ok = False
+    return time.perf_counter() - started, ok
+
+def run_http(base_url, fixture, scenarios, iterations=50, warmup=5, seed=1, concurrency=4):
+    # Each scenario's requests are spread over `concurrency` threads against a running server
+    base_url = base_url.rstrip('/')
+    rng = random.Random(seed)
+    openers = {}
+    openers_lock = threading.Lock()
+
+    def opener_for(user):
+        with openers_lock:
+            if user.id not in openers:
+                openers[user.id] = _login_opener(base_url, user)
+            return openers[user.id]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for scenario in scenarios:
+            plan = []
+            for _ in range(warmup + iterations):
+                user = rng.choice(fixture.users)
+                plan.append((user, scenario.build(rng, user, fixture)))
+            for user, (method, path, kwargs) in plan[:warmup]:
+                _http_request(opener_for(user), base_url, method, path, kwargs)
+            started = time.perf_counter()
+            outcomes = list(pool.map(lambda item: _http_request(opener_for(item[0]), base_url, *item[1]),
+                                     plan[warmup:]))
+            wall = time.perf_counter() - started
+            results[scenario.name] = summarize([elapsed for elapsed, _ in outcomes], wall,
+                                               errors=sum(not ok for _, ok in outcomes))
+            print(f"{scenario.name:28} p50 {results[scenario.name]['p50_ms']:9.2f} ms  "
+                  f"p95 {results[scenario.name]['p95_ms']:9.2f} ms  "
+                  f"{results[scenario.name]['throughput_rps']:8.1f} req/s")
+    return results
+
+def report(results, settings):
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': settings,
+        'scenarios': results
+    }
+
+def compare(current, baseline, tolerance=0.2, metric='p95_ms'):
+    # Scenarios whose `metric` grew by more than `tolerance` (a fraction) over the baseline
+    regressions = []
+    for name, result in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before or not before.get(metric):
+            continue
+        change = result[metric] / before[metric] - 1
+        marker = 'REGRESSION' if change > tolerance else ''
+        print(f"{name:28} {before[metric]:9.2f} -> {result[metric]:9.2f} ms  {change:+7.1%} {marker}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
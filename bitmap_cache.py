@@ -0,0 +1,157 @@
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+
+# Process-local cache of yes/no completion history. Each (habit_id, year) entry
+# is a pair of Python ints used as 366-bit bitmaps: bit i of `done` is set when
+# day i of the year was marked "Yes", bit i of `logged` when the day has a log
+# at all (so "No" can be told apart from unset).
+
+# Per-entry bookkeeping besides the two ints: key tuple, OrderedDict node, value tuple
+ENTRY_OVERHEAD = 200
+
+def year_start(year):
+    return date(year, 1, 1).toordinal()
+
+def iter_bits(bits):
+    # Indexes of set bits, lowest first
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+class BitmapCache:
+    def __init__(self, loader, max_bytes=8 * 1024 * 1024):
+        # loader(habit_ids, year) -> {habit_id: [(day, value), ...]} for the whole year
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0  # bumped by every write-through, so stale loads are not stored
+        self.lock = threading.Lock()
+
+    def _size(self, entry):
+        return sys.getsizeof(entry[0]) + sys.getsizeof(entry[1]) + ENTRY_OVERHEAD
+
+    def _store(self, key, entry):
+        if key in self.entries:
+            self.bytes -= self._size(self.entries[key])
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.bytes += self._size(entry)
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= self._size(evicted)
+            self.evictions += 1
+
+    def get_many(self, habit_ids, year):
+        # {habit_id: (done, logged)}; all misses are loaded with one loader call
+        result = {}
+        missing = []
+        with self.lock:
+            for habit_id in habit_ids:
+                entry = self.entries.get((habit_id, year))
+                if entry is None:
+                    missing.append(habit_id)
+                else:
+                    self.entries.move_to_end((habit_id, year))
+                    result[habit_id] = entry
+            self.hits += len(result)
+            self.misses += len(missing)
+            writes = self.writes
+        if not missing:
+            return result
+
+        first = year_start(year)
+        loaded = self.loader(missing, year)
+        with self.lock:
+            keep = writes == self.writes
+            for habit_id in missing:
+                done = logged = 0
+                for day, value in loaded.get(habit_id, ()):
+                    bit = 1 << (day - first)
+                    logged |= bit
+                    if value:
+                        done |= bit
+                result[habit_id] = (done, logged)
+                if keep:
+                    self._store((habit_id, year), result[habit_id])
+        return result
+
+    def get(self, habit_id, year):
+        return self.get_many([habit_id], year)[habit_id]
+
+    def set_day(self, habit_id, day, value):
+        # Write-through for a single day; years that are not cached stay unloaded
+        year = date.fromordinal(day).year
+        bit = 1 << (day - year_start(year))
+        with self.lock:
+            self.writes += 1
+            entry = self.entries.get((habit_id, year))
+            if entry is None:
+                return
+            done, logged = entry
+            done = done | bit if value else done & ~bit
+            self._store((habit_id, year), (done, logged | bit))
+
+    def invalidate(self, habit_id=None):
+        if habit_id is None:
+            with self.lock:
+                self.writes += 1
+                self.entries.clear()
+                self.bytes = 0
+        else:
+            self.invalidate_many([habit_id])
+
+    def invalidate_many(self, habit_ids):
+        habit_ids = set(habit_ids)
+        with self.lock:
+            self.writes += 1
+            for key in [k for k in self.entries if k[0] in habit_ids]:
+                self.bytes -= self._size(self.entries.pop(key))
+
+    def day_values(self, habit_ids, day):
+        # {habit_id: bool} for habits that have a log on `day`
+        year = date.fromordinal(day).year
+        bit = 1 << (day - year_start(year))
+        return {habit_id: bool(done & bit)
+                for habit_id, (done, logged) in self.get_many(habit_ids, year).items() if logged & bit}
+
+    def range_rows(self, habit_id, start, end):
+        # (day, value) rows for logged days in the inclusive ordinal range
+        rows = []
+        for year in range(date.fromordinal(start).year, date.fromordinal(end).year + 1):
+            first = year_start(year)
+            done, logged = self.get(habit_id, year)
+            low, high = max(start - first, 0), min(end, year_start(year + 1) - 1) - first
+            window = (logged >> low) & ((1 << (high - low + 1)) - 1)
+            for index in iter_bits(window):
+                day = first + low + index
+                rows.append((day, bool(done >> (low + index) & 1)))
+        return rows
+
+    def done_days(self, habit_ids, start, end):
+        # {habit_id: [day, ...]} of "Yes" days in the inclusive ordinal range
+        result = {habit_id: [] for habit_id in habit_ids}
+        for year in range(date.fromordinal(start).year, date.fromordinal(end).year + 1):
+            first = year_start(year)
+            low, high = max(start - first, 0), min(end, year_start(year + 1) - 1) - first
+            mask = (1 << (high - low + 1)) - 1
+            for habit_id, (done, _) in self.get_many(habit_ids, year).items():
+                result[habit_id].extend(first + low + index for index in iter_bits((done >> low) & mask))
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
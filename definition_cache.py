@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Process-local cache of each user's habit and measurable definitions. Entries
+# are immutable records, so they can be shared between requests and threads
+# without touching the ORM session. Writers call invalidate(user_id); the TTL
+# bounds how long another process can serve a stale entry.
+
+Definitions = namedtuple('Definitions', 'habits measurables')
+
+class DefinitionCache:
+    def __init__(self, loader, max_users=1024, ttl=300):
+        # loader(user_id) -> Definitions of models.HabitRecord / MeasurableRecord tuples, ordered by id
+        self.loader = loader
+        self.max_users = max_users
+        self.ttl = ttl
+        self.entries = OrderedDict()  # user_id -> (loaded_at, Definitions)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0  # bumped by invalidate, so loads that raced a write are not stored
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            writes = self.writes
+
+        definitions = self.loader(user_id)
+        with self.lock:
+            if writes == self.writes:
+                self.entries[user_id] = (now, definitions)
+                self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_users:
+                    self.entries.popitem(last=False)
+        return definitions
+
+    def habits(self, user_id):
+        return self.get(user_id).habits
+
+    def measurables(self, user_id):
+        return self.get(user_id).measurables
+
+    def habit(self, user_id, habit_id):
+        return next((h for h in self.habits(user_id) if h.id == habit_id), None)
+
+    def measurable(self, user_id, measurable_id):
+        return next((m for m in self.measurables(user_id) if m.id == measurable_id), None)
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            self.writes += 1
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'max_users': self.max_users, 'hits': self.hits,
+                    'misses': self.misses}
@@ -0,0 +1,122 @@
+import csv
+import io
+import zlib
+
+# Encoders for the flat export formats. Each takes an iterator of rows or
+# text chunks and yields output chunks as it goes, so a response can stream
+# them without the whole file ever being held in memory.
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+CSV_BATCH_ROWS = 1000
+ARROW_BATCH_ROWS = 64 * 1024  # rows per record batch / Parquet row group
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# codec -> (file suffix, mimetype)
+COMPRESSION = {'gzip': ('gz', 'application/gzip'), 'zstd': ('zst', 'application/zstd')}
+
+def iter_csv(header, rows, batch_rows=CSV_BATCH_ROWS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+def iter_compressed(chunks, codec='gzip'):
+    # Text or bytes chunks in, compressed bytes out; the compressor only keeps its window
+    if codec == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif codec == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError('zstd compression needs the zstandard package: pip install zstandard')
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        raise ValueError(f'Unknown compression: {codec}')
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+class _ChunkSink:
+    # Write-only file object for pyarrow writers; drain() hands over what was written so far
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _arrow_type(name):
+    return {'int32': pyarrow.int32, 'int64': pyarrow.int64, 'float64': pyarrow.float64,
+            'bool': pyarrow.bool_, 'string': pyarrow.string}[name]()
+
+def iter_arrow(columns, rows, file_format='parquet', batch_rows=ARROW_BATCH_ROWS):
+    # columns: [(name, type name)], rows: tuples in column order. Parquet gets one
+    # row group per batch; 'arrow' is the Arrow IPC stream format.
+    if not ARROW_AVAILABLE:
+        raise RuntimeError('Parquet and Arrow exports need pyarrow: pip install pyarrow')
+    schema = pyarrow.schema([(name, _arrow_type(kind)) for name, kind in columns])
+    sink = _ChunkSink()
+    output = pyarrow.PythonFile(sink, mode='w')
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(output, schema)
+    else:
+        writer = pyarrow.ipc.new_stream(output, schema)
+
+    def write(batch):
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            write(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.drain()
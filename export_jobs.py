@@ -0,0 +1,165 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Background export jobs. A job runs `build(job, path)` on a small worker pool;
+# the build writes the finished file to `path` and reports progress through
+# job.track(). Finished files live in one artifact directory and are removed
+# once they are older than `ttl` seconds. Each job's state is also written to
+# a `<job_id>.json` sidecar next to the artifact, so any worker process sharing
+# the directory can answer status and download requests for it.
+
+PROGRESS_SAVE_INTERVAL = 1.0  # seconds between sidecar writes while a job runs
+JOB_ID = re.compile(r'[0-9a-f]{32}')
+STATE_FIELDS = ('id', 'user_id', 'kind', 'filename', 'mimetype', 'status', 'done', 'total', 'error', 'path',
+                'created', 'finished')
+
+class QueueFull(Exception):
+    pass
+
+class ExportJob:
+    def __init__(self, user_id, kind, filename, mimetype, state_path=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.filename = filename
+        self.mimetype = mimetype
+        self.status = 'queued'
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.path = None
+        self.created = time.time()
+        self.finished = None
+        self.state_path = state_path
+        self.saved = 0.0
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def advance(self, rows=1):
+        self.done += rows
+        if time.time() - self.saved >= PROGRESS_SAVE_INTERVAL:
+            self.save()
+
+    def track(self, rows):
+        # Counts rows towards progress as they pass through
+        for row in rows:
+            self.advance()
+            yield row
+
+    def save(self):
+        if self.state_path is None:
+            return
+        partial = f'{self.state_path}.tmp'
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump({field: getattr(self, field) for field in STATE_FIELDS}, f)
+        os.replace(partial, self.state_path)
+        self.saved = time.time()
+
+    @classmethod
+    def load(cls, state_path):
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        job = cls(state['user_id'], state['kind'], state['filename'], state['mimetype'])
+        for field in STATE_FIELDS:
+            setattr(job, field, state[field])
+        return job
+
+    def to_dict(self):
+        progress = 1.0 if self.status == 'done' else (min(self.done / self.total, 1.0) if self.total else 0.0)
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(progress, 3),
+            'rows_done': self.done,
+            'rows_total': self.total,
+            'error': self.error,
+            'filename': self.filename
+        }
+
+class ExportJobs:
+    def __init__(self, directory, max_workers=2, max_pending=8, ttl=3600):
+        self.directory = directory
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+
+    def submit(self, user_id, kind, filename, mimetype, build):
+        # Returns (job, created); a user's active job of the same kind is reused
+        self.cleanup()
+        with self.lock:
+            for job in self.jobs.values():
+                if job.user_id == user_id and job.kind == kind and job.active:
+                    return job, False
+            if sum(job.active for job in self.jobs.values()) >= self.max_pending:
+                raise QueueFull()
+            job = ExportJob(user_id, kind, filename, mimetype)
+            job.state_path = os.path.join(self.directory, f'{job.id}.json')
+            self.jobs[job.id] = job
+        os.makedirs(self.directory, exist_ok=True)
+        job.save()
+        self.pool.submit(self._run, job, build)
+        return job, True
+
+    def _run(self, job, build):
+        path = os.path.join(self.directory, f'{job.id}.part')
+        job.status = 'running'
+        job.save()
+        try:
+            build(job, path)
+            job.path = os.path.join(self.directory, job.id)
+            os.replace(path, job.path)
+            job.status = 'done'
+        except Exception as e:
+            print(f"Export job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+            if os.path.exists(path):
+                os.remove(path)
+        job.finished = time.time()
+        job.save()
+
+    def get(self, job_id, user_id):
+        self.cleanup()
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None and JOB_ID.fullmatch(job_id):
+            # Submitted by another process
+            try:
+                job = ExportJob.load(os.path.join(self.directory, f'{job_id}.json'))
+            except (OSError, ValueError, KeyError):
+                return None
+        return job if job is not None and job.user_id == user_id else None
+
+    def cleanup(self):
+        now = time.time()
+        with self.lock:
+            expired = [job for job in self.jobs.values() if job.finished and now - job.finished > self.ttl]
+            for job in expired:
+                del self.jobs[job.id]
+                for path in (job.path, job.state_path):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+            if not os.path.isdir(self.directory):
+                return
+            # Artifacts left behind by an earlier process
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    if name.split('.')[0] not in self.jobs and now - os.path.getmtime(path) > self.ttl:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass  # removed by another process meanwhile
+
+    def stats(self):
+        with self.lock:
+            return {'jobs': len(self.jobs), 'active': sum(job.active for job in self.jobs.values())}
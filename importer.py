@@ -0,0 +1,164 @@
+import csv
+import json
+
+# Incremental readers for the import formats. Each yields (kind, record) pairs:
+# 'habit' / 'measurable' definitions keyed by their source `id`, then
+# 'habit_log' / 'measurable_log' rows pointing at that id, 'journal' entries
+# and 'export_info'. Lines or cells that cannot be read come out as
+# ('invalid', {'error': ...}) so the caller can count them and carry on.
+# Only one JSON array element, NDJSON line or CSV row is held at a time.
+
+READ_SIZE = 64 * 1024
+MAX_VALUE_SIZE = 64 * 1024 * 1024  # one array element or top-level value
+SECTION_KINDS = {'habits': 'habit', 'measurables': 'measurable', 'journals': 'journal'}
+LOOP_YES = {'2', '1', 'Y', 'YES', 'TRUE'}
+LOOP_NO = {'0', 'N', 'NO', 'FALSE'}
+
+class ImportFormatError(Exception):
+    pass
+
+class _JsonReader:
+    # Decodes one JSON value at a time from a text stream with raw_decode,
+    # reading more input whenever the buffered text ends mid-value
+    decoder = json.JSONDecoder()
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=READ_SIZE):
+        chunk = self.stream.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, or '' at the end of the input
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def take(self, expected):
+        char = self.peek()
+        if char not in expected:
+            raise ImportFormatError(f"Invalid JSON: expected {' or '.join(repr(c) for c in expected)}, "
+                                    f"found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        size = READ_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if len(self.buf) - self.pos > MAX_VALUE_SIZE or not self._fill(size):
+                    raise ImportFormatError(f'Invalid JSON: {e.msg}')
+                size *= 2  # large values get larger reads, so re-decoding stays linear
+                continue
+            # A bare number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not isinstance(value, (dict, list, str)) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def _definition_records(kind, record):
+    if not isinstance(record, dict):
+        yield 'invalid', {'error': f'{kind} entry is not an object'}
+        return
+    if kind == 'journal':
+        yield kind, record
+        return
+    logs = record.pop('logs', None) or []
+    yield kind, record
+    for log in logs:
+        if isinstance(log, dict):
+            yield f'{kind}_log', {f'{kind}_id': record.get('id'), **log}
+        else:
+            yield 'invalid', {'error': f'{kind} log is not an object'}
+
+def iter_json_document(stream):
+    # The /api/export/json document; statistics are derived data and are skipped
+    reader = _JsonReader(stream)
+    reader.take('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.take(':')
+        if key in SECTION_KINDS and reader.peek() == '[':
+            reader.take('[')
+            if reader.peek() == ']':
+                reader.take(']')
+            else:
+                while True:
+                    yield from _definition_records(SECTION_KINDS[key], reader.value())
+                    if reader.take(',]') == ']':
+                        break
+        else:
+            value = reader.value()
+            if key == 'export_info':
+                yield 'export_info', value
+        if reader.take(',}') == '}':
+            return
+
+def iter_ndjson(stream):
+    # One {"kind": ..., ...} object per line, as written by ?format=ndjson
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            kind = record.pop('kind')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            yield 'invalid', {'error': f'Line {number}: not a JSON object with a "kind"'}
+            continue
+        yield kind, record
+
+def iter_loop_csv(stream):
+    # Loop Habit Tracker style checkmarks: a Date column, then one column per
+    # yes/no habit. Positive values and YES mean done, 0 and NO mean not done,
+    # negative or empty cells are unknown days and are skipped.
+    rows = csv.reader(stream)
+    header = next(rows, None)
+    if not header or header[0].strip().lower() != 'date':
+        raise ImportFormatError('CSV must start with a "Date" column')
+    names = [name.strip() for name in header[1:]]
+    for name in names:
+        yield 'habit', {'id': name, 'name': name, 'type': 'yesno'}
+    for number, row in enumerate(rows, 2):
+        if not row or not row[0].strip():
+            continue
+        for name, cell in zip(names, row[1:]):
+            cell = cell.strip().upper()
+            if cell in LOOP_YES or cell in LOOP_NO:
+                yield 'habit_log', {'habit_id': name, 'date': row[0].strip(), 'value': cell in LOOP_YES}
+                continue
+            try:
+                amount = float(cell) if cell else -1
+            except ValueError:
+                yield 'invalid', {'error': f'Row {number}: unreadable value {cell!r} for {name}'}
+                continue
+            if amount >= 0:
+                yield 'habit_log', {'habit_id': name, 'date': row[0].strip(), 'value': amount > 0}
+
+READERS = {'json': iter_json_document, 'ndjson': iter_ndjson, 'csv': iter_loop_csv}
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    return 'json'
@@ -0,0 +1,82 @@
+import bisect
+import threading
+
+# Minimal Prometheus text-format metrics: labelled histograms and counters
+# kept in process memory, plus a helper for values read from elsewhere.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=('endpoint',), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [count per bucket..., count above last bucket, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(labels + [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(labels)} {_number(series[-1])}')
+            lines.append(f'{self.name}_count{_labels(labels)} {cumulative}')
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            snapshot = dict(self.values)
+        for label_values, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{_labels(list(zip(self.label_names, label_values)))} {_number(value)}')
+        return lines
+
+def sample(name, help_text, values, kind='gauge'):
+    # values: {((label, value), ...): number}, or a bare number for an unlabelled metric
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    if not isinstance(values, dict):
+        values = {(): values}
+    for labels, value in values.items():
+        lines.append(f'{name}{_labels(list(labels))} {_number(value)}')
+    return lines
@@ -1,26 +1,316 @@
+from collections import namedtuple
+from flask import current_app, g
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 
-db = SQLAlchemy()
+# The schema and every read query the routes share. Writes go through the
+# ORM models (or Core upserts in app.py); reads select plain columns with
+# Core and return immutable named-tuple records, so pages that touch
+# thousands of rows never build tracked instances or fill the identity map.
+
+# ------------------ Session ------------------
+class RoutingSession(FlaskSession):
+    # Queries made inside @read_only views go to the read-only pool when there is one
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and g and g.get('read_only'):
+            engine = current_app.extensions.get('read_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# ------------------ Models ------------------
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+    data_version = db.Column(db.Integer, nullable=False, default=0)  # bumped by every data write
 
 class Habit(db.Model):
-    id          = db.Column(db.Integer, primary_key=True)
-    name        = db.Column(db.String(100), nullable=False)
-    color       = db.Column(db.String(20), nullable=False)
-    question    = db.Column(db.String(200), nullable=False)
-    # fields for measurable habits
-    unit        = db.Column(db.String(20))
-    target      = db.Column(db.Float)
-    target_type = db.Column(db.String(20))
-    frequency   = db.Column(db.String(50), nullable=False)
-    reminder    = db.Column(db.String(20), nullable=False)
-    notes       = db.Column(db.Text)
-    habit_type  = db.Column(db.String(20), default='yesno')
-
-class HabitStatus(db.Model):
-    id       = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    question = db.Column(db.String(255))
+    notes = db.Column(db.Text)
+    color = db.Column(db.String(20))
+
+class Measurable(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    question = db.Column(db.String(255))
+    unit_target = db.Column(db.String(50), nullable=False)
+    target_type = db.Column(db.String(20), nullable=False)  # Atleast or Atmost
+    notes = db.Column(db.Text)
+    color = db.Column(db.String(20))
+
+class HabitLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
     habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), nullable=False)
-    date     = db.Column(db.Date, nullable=False)
-    status   = db.Column(db.String(10), nullable=False)  # 'pending','done','missed'
+    date = db.Column(db.String(10), nullable=False)  # 'YYYY-MM-DD'
+    day = db.Column(db.Integer, nullable=False)  # date.toordinal()
+    value = db.Column(db.Boolean)
+    __table_args__ = (
+        db.Index('ix_habit_log_habit_id_day', 'habit_id', 'day', unique=True),
+    )
+
+class MeasurableLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    measurable_id = db.Column(db.Integer, db.ForeignKey('measurable.id'), nullable=False)
+    date = db.Column(db.String(10), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    value = db.Column(db.Float)
+    __table_args__ = (
+        db.Index('ix_measurable_log_measurable_id_day', 'measurable_id', 'day', unique=True),
+    )
+
+class Journal(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.String(10), nullable=False)  # Format: YYYY-MM-DD
+    day = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=True)
     __table_args__ = (
-        db.UniqueConstraint('habit_id', 'date', name='unique_habit_date'),
+        db.Index('ix_journal_user_id_day', 'user_id', 'day', unique=True),
     )
+
+class HabitStreak(db.Model):
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), primary_key=True)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)  # run ending at last_completed
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_completed = db.Column(db.Integer)  # day ordinal of the latest "Yes"
+
+class HabitMonthRollup(db.Model):
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    yes_count = db.Column(db.Integer, nullable=False, default=0)
+    logged_count = db.Column(db.Integer, nullable=False, default=0)
+
+class MeasurableMonthRollup(db.Model):
+    measurable_id = db.Column(db.Integer, db.ForeignKey('measurable.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    entries = db.Column(db.Integer, nullable=False, default=0)  # non-zero values
+    total = db.Column(db.Float, nullable=False, default=0)
+    minimum = db.Column(db.Float)  # over non-zero values
+    maximum = db.Column(db.Float)
+
+# All-time aggregates written by `flask recompute-stats`; computed_version is
+# the owner's data_version at the time, so readers can tell stale rows apart
+class HabitStats(db.Model):
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), primary_key=True)
+    first_day = db.Column(db.Integer)
+    last_day = db.Column(db.Integer)
+    logged_days = db.Column(db.Integer, nullable=False, default=0)
+    completed_days = db.Column(db.Integer, nullable=False, default=0)
+    completion_rate = db.Column(db.Float)  # percent of logged days
+    computed_version = db.Column(db.Integer, nullable=False, default=0)
+
+class MeasurableStats(db.Model):
+    measurable_id = db.Column(db.Integer, db.ForeignKey('measurable.id'), primary_key=True)
+    first_day = db.Column(db.Integer)
+    last_day = db.Column(db.Integer)
+    logged_days = db.Column(db.Integer, nullable=False, default=0)
+    entries = db.Column(db.Integer, nullable=False, default=0)  # non-zero values
+    total = db.Column(db.Float, nullable=False, default=0)
+    average = db.Column(db.Float)
+    minimum = db.Column(db.Float)
+    maximum = db.Column(db.Float)
+    computed_version = db.Column(db.Integer, nullable=False, default=0)
+
+class StatsCheckpoint(db.Model):
+    # Users finished by a recompute-stats run, written with their results
+    run_id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+# ------------------ Read Records ------------------
+HabitRecord = namedtuple('HabitRecord', 'id name type question notes color')
+MeasurableRecord = namedtuple('MeasurableRecord', 'id name question unit_target target_type notes color')
+DayValue = namedtuple('DayValue', 'day value')
+HabitDayValue = namedtuple('HabitDayValue', 'habit_id day value')
+MeasurableDayValue = namedtuple('MeasurableDayValue', 'measurable_id day value')
+LogEntry = namedtuple('LogEntry', 'owner_id date value')  # export rows, ordered by owner
+JournalEntry = namedtuple('JournalEntry', 'date content')
+HabitLogRow = namedtuple('HabitLogRow', 'habit_id day date value')  # flat table exports
+MeasurableLogRow = namedtuple('MeasurableLogRow', 'measurable_id day date value')
+JournalRow = namedtuple('JournalRow', 'day date content')
+OwnerLog = namedtuple('OwnerLog', 'owner_id day value')
+HabitStatsRow = namedtuple('HabitStatsRow', 'habit_id first_day last_day logged_days completed_days completion_rate '
+                                            'computed_version')
+MeasurableStatsRow = namedtuple('MeasurableStatsRow', 'measurable_id first_day last_day logged_days entries total '
+                                                      'average minimum maximum computed_version')
+HabitMonth = namedtuple('HabitMonth', 'month yes_count logged_count')
+MeasurableMonth = namedtuple('MeasurableMonth', 'month entries total minimum maximum')
+StreakRecord = namedtuple('StreakRecord', 'current_streak longest_streak last_completed')
+HabitTotals = namedtuple('HabitTotals', 'habit_id yes_count logged_count')
+MeasurableTotals = namedtuple('MeasurableTotals', 'measurable_id entries total maximum minimum')
+
+def fetch(record, stmt, batch_size=None):
+    # Runs a Core select and builds `record` from each row: a list, or a lazy
+    # iterator reading `batch_size` rows at a time for exports
+    if batch_size:
+        return map(record._make, db.session.execute(stmt.execution_options(yield_per=batch_size)))
+    return [record._make(row) for row in db.session.execute(stmt)]
+
+# ------------------ Read Queries ------------------
+def habit_definitions(user_id):
+    return fetch(HabitRecord, db.select(
+        Habit.id, Habit.name, Habit.type, Habit.question, Habit.notes, Habit.color
+    ).where(Habit.user_id == user_id).order_by(Habit.id))
+
+def measurable_definitions(user_id):
+    return fetch(MeasurableRecord, db.select(
+        Measurable.id, Measurable.name, Measurable.question, Measurable.unit_target,
+        Measurable.target_type, Measurable.notes, Measurable.color
+    ).where(Measurable.user_id == user_id).order_by(Measurable.id))
+
+def habit_log_rows(habit_id, start, end):
+    # (day, value) rows for an inclusive ordinal range
+    return fetch(DayValue, db.select(HabitLog.day, HabitLog.value).where(
+        HabitLog.habit_id == habit_id,
+        HabitLog.day.between(start, end)
+    ))
+
+def measurable_log_rows(measurable_id, start, end):
+    return fetch(DayValue, db.select(MeasurableLog.day, MeasurableLog.value).where(
+        MeasurableLog.measurable_id == measurable_id,
+        MeasurableLog.day.between(start, end)
+    ))
+
+def habits_log_rows(habit_ids, start, end):
+    return fetch(HabitDayValue, db.select(HabitLog.habit_id, HabitLog.day, HabitLog.value).where(
+        HabitLog.habit_id.in_(habit_ids),
+        HabitLog.day.between(start, end)
+    ))
+
+def user_habit_log_rows(user_id, start, end):
+    # Every habit log of one user in the range, ordered by day
+    return fetch(HabitDayValue, db.select(HabitLog.habit_id, HabitLog.day, HabitLog.value).join(Habit).where(
+        Habit.user_id == user_id,
+        HabitLog.day.between(start, end)
+    ).order_by(HabitLog.day))
+
+def user_measurable_log_rows(user_id, start, end):
+    return fetch(MeasurableDayValue, db.select(
+        MeasurableLog.measurable_id, MeasurableLog.day, MeasurableLog.value
+    ).join(Measurable).where(
+        Measurable.user_id == user_id,
+        MeasurableLog.day.between(start, end)
+    ).order_by(MeasurableLog.day))
+
+def first_habit_day(habit_id):
+    return db.session.execute(db.select(db.func.min(HabitLog.day)).where(HabitLog.habit_id == habit_id)).scalar()
+
+def first_measurable_day(measurable_id):
+    return db.session.execute(
+        db.select(db.func.min(MeasurableLog.day)).where(MeasurableLog.measurable_id == measurable_id)
+    ).scalar()
+
+def measurable_colors_by_date(user_id, start, end, default_color):
+    # Distinct (date, color) pairs of days with a non-zero measurable value
+    color = db.func.coalesce(db.func.nullif(Measurable.color, ''), default_color)
+    return db.session.execute(db.select(MeasurableLog.date, color).join(Measurable).where(
+        Measurable.user_id == user_id,
+        MeasurableLog.day.between(start, end),
+        MeasurableLog.value > 0
+    ).group_by(MeasurableLog.date, color)).all()
+
+def habit_streak(habit_id):
+    row = db.session.execute(db.select(
+        HabitStreak.current_streak, HabitStreak.longest_streak, HabitStreak.last_completed
+    ).where(HabitStreak.habit_id == habit_id)).first()
+    return StreakRecord._make(row) if row else None
+
+def habit_month_rollups(habit_id, year):
+    return fetch(HabitMonth, db.select(
+        HabitMonthRollup.month, HabitMonthRollup.yes_count, HabitMonthRollup.logged_count
+    ).where(HabitMonthRollup.habit_id == habit_id, HabitMonthRollup.year == year))
+
+def measurable_month_rollups(measurable_id, year):
+    return fetch(MeasurableMonth, db.select(
+        MeasurableMonthRollup.month, MeasurableMonthRollup.entries, MeasurableMonthRollup.total,
+        MeasurableMonthRollup.minimum, MeasurableMonthRollup.maximum
+    ).where(MeasurableMonthRollup.measurable_id == measurable_id, MeasurableMonthRollup.year == year))
+
+def habit_rollup_totals(habit_ids):
+    return fetch(HabitTotals, db.select(
+        HabitMonthRollup.habit_id,
+        db.func.sum(HabitMonthRollup.yes_count),
+        db.func.sum(HabitMonthRollup.logged_count)
+    ).where(HabitMonthRollup.habit_id.in_(habit_ids)).group_by(HabitMonthRollup.habit_id))
+
+def measurable_rollup_totals(measurable_ids):
+    return fetch(MeasurableTotals, db.select(
+        MeasurableMonthRollup.measurable_id,
+        db.func.sum(MeasurableMonthRollup.entries),
+        db.func.sum(MeasurableMonthRollup.total),
+        db.func.max(MeasurableMonthRollup.maximum),
+        db.func.min(MeasurableMonthRollup.minimum)
+    ).where(MeasurableMonthRollup.measurable_id.in_(measurable_ids)).group_by(MeasurableMonthRollup.measurable_id))
+
+def journal_content(user_id, day):
+    return db.session.execute(db.select(Journal.content).where(
+        Journal.user_id == user_id, Journal.day == day
+    )).scalar()
+
+def journal_count(user_id):
+    return db.session.execute(db.select(db.func.count(Journal.id)).where(Journal.user_id == user_id)).scalar()
+
+# Export reads: the whole history of one user, streamed in batches
+def export_habit_logs(user_id, batch_size):
+    return fetch(LogEntry, db.select(HabitLog.habit_id, HabitLog.date, HabitLog.value).join(Habit).where(
+        Habit.user_id == user_id
+    ).order_by(HabitLog.habit_id, HabitLog.day), batch_size)
+
+def export_measurable_logs(user_id, batch_size):
+    return fetch(LogEntry, db.select(
+        MeasurableLog.measurable_id, MeasurableLog.date, MeasurableLog.value
+    ).join(Measurable).where(
+        Measurable.user_id == user_id
+    ).order_by(MeasurableLog.measurable_id, MeasurableLog.day), batch_size)
+
+def export_journals(user_id, batch_size):
+    return fetch(JournalEntry, db.select(Journal.date, Journal.content).where(
+        Journal.user_id == user_id
+    ).order_by(Journal.day), batch_size)
+
+def habit_log_table(user_id, batch_size):
+    return fetch(HabitLogRow, db.select(HabitLog.habit_id, HabitLog.day, HabitLog.date, HabitLog.value).join(
+        Habit
+    ).where(Habit.user_id == user_id).order_by(HabitLog.habit_id, HabitLog.day), batch_size)
+
+def measurable_log_table(user_id, batch_size):
+    return fetch(MeasurableLogRow, db.select(
+        MeasurableLog.measurable_id, MeasurableLog.day, MeasurableLog.date, MeasurableLog.value
+    ).join(Measurable).where(
+        Measurable.user_id == user_id
+    ).order_by(MeasurableLog.measurable_id, MeasurableLog.day), batch_size)
+
+def journal_table(user_id, batch_size):
+    return fetch(JournalRow, db.select(Journal.day, Journal.date, Journal.content).where(
+        Journal.user_id == user_id
+    ).order_by(Journal.day), batch_size)
+
+def habit_stats_table(user_id, batch_size):
+    return fetch(HabitStatsRow, db.select(*HabitStats.__table__.columns).join(Habit).where(
+        Habit.user_id == user_id
+    ).order_by(HabitStats.habit_id), batch_size)
+
+def measurable_stats_table(user_id, batch_size):
+    return fetch(MeasurableStatsRow, db.select(*MeasurableStats.__table__.columns).join(Measurable).where(
+        Measurable.user_id == user_id
+    ).order_by(MeasurableStats.measurable_id), batch_size)
+
+# Stats job reads: every log of a shard of users, ordered by owner and day
+def shard_habit_logs(user_ids, batch_size):
+    return fetch(OwnerLog, db.select(HabitLog.habit_id, HabitLog.day, HabitLog.value).join(Habit).where(
+        Habit.user_id.in_(user_ids)
+    ).order_by(HabitLog.habit_id, HabitLog.day), batch_size)
+
+def shard_measurable_logs(user_ids, batch_size):
+    return fetch(OwnerLog, db.select(MeasurableLog.measurable_id, MeasurableLog.day, MeasurableLog.value).join(
+        Measurable
+    ).where(Measurable.user_id.in_(user_ids)).order_by(MeasurableLog.measurable_id, MeasurableLog.day), batch_size)
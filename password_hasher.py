@@ -0,0 +1,115 @@
+import atexit
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing off the request thread. The "process" backend runs werkzeug's
+# hash/check on a process pool so the CPU-bound work does not hold the GIL of
+# the serving process; "inline" runs them in the caller (tests, single-user dev).
+# At most `max_pending` calls may be queued or running; beyond that callers wait
+# up to `queue_timeout` seconds and then get HasherBusy.
+
+LATENCY_SAMPLES = 1000
+
+class HasherBusy(Exception):
+    pass
+
+def _percentile_ms(ordered, q):
+    if not ordered:
+        return 0
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+def _hash_prefix(stored):
+    # "scrypt:32768:8:1$salt$hash" -> "scrypt:32768:8:1"
+    return stored.split('$', 1)[0]
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', backend='process', workers=2, max_pending=16, queue_timeout=5.0):
+        self.method = method
+        self.backend = backend
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.current_prefix = None
+        self.rejected = 0
+        self.rehashed = 0
+        self.samples = {'hash': deque(maxlen=LATENCY_SAMPLES), 'check': deque(maxlen=LATENCY_SAMPLES)}
+        self.counts = {'hash': 0, 'check': 0}
+
+    def _run(self, operation, func, *args):
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise HasherBusy()
+        started = time.perf_counter()
+        try:
+            return self._call(func, *args)
+        finally:
+            self.slots.release()
+            self.samples[operation].append(time.perf_counter() - started)
+            self.counts[operation] += 1
+
+    def _call(self, func, *args):
+        if self.backend == 'inline':
+            return func(*args)
+        return self._pool().submit(func, *args).result()
+
+    def _pool(self):
+        # Created on first use so importing the app does not start workers. Spawned,
+        # not forked: forking a threaded server can copy locks held by other threads.
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+                # Left running, the workers' pipes are torn down mid-exit and the
+                # executor's own exit hook fails with "Bad file descriptor"
+                atexit.register(self.shutdown)
+            return self.pool
+
+    def shutdown(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def check(self, stored, password):
+        return self._run('check', check_password_hash, stored, password)
+
+    def verify(self, stored, password):
+        # (valid, new_hash); new_hash is set when the password matched a hash
+        # made with outdated parameters and should replace it
+        if not self.check(stored, password):
+            return False, None
+        if not self.needs_rehash(stored):
+            return True, None
+        self.rehashed += 1
+        return True, self.hash(password)
+
+    def needs_rehash(self, stored):
+        # True when `stored` was made with other parameters than the configured
+        # method; werkzeug expands a bare method name into its defaults, so the
+        # full prefix is learnt from one real hash, kept out of the latency samples
+        if self.current_prefix is None:
+            self.current_prefix = _hash_prefix(self._call(generate_password_hash, '', self.method))
+        return _hash_prefix(stored) != self.current_prefix
+
+    def stats(self):
+        result = {'backend': self.backend, 'method': self.method, 'rejected': self.rejected,
+                  'rehashed': self.rehashed}
+        for operation, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[operation] = {
+                'count': self.counts[operation],
+                'p50_ms': _percentile_ms(ordered, 0.50),
+                'p95_ms': _percentile_ms(ordered, 0.95),
+                'p99_ms': _percentile_ms(ordered, 0.99),
+                'max_ms': _percentile_ms(ordered, 1.0)
+            }
+        return result
@@ -0,0 +1,126 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+
+# Batch recomputation of derived data. The aggregate functions turn one
+# owner's log rows, ordered by day, into its streak, monthly rollups and
+# all-time stats in a single pass. run_shards() spreads shards of users over
+# a process pool; each worker reads and writes its own shard, so the parent
+# only schedules work and reports progress.
+
+def shards(user_ids, size):
+    return [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+
+def _month(day):
+    d = date.fromordinal(day)
+    return d.year, d.month
+
+def habit_aggregates(habit_id, rows):
+    # rows: (day, value) ordered by day. Mirrors STREAK_RECOMPUTE_SQL and HABIT_ROLLUP_SQL:
+    # NULL values count as logged but not completed.
+    months = {}
+    logged = completed = 0
+    first_day = last_day = last_completed = None
+    run = longest = 0
+    for day, value in rows:
+        if first_day is None:
+            first_day = day
+        last_day = day
+        logged += 1
+        month = months.setdefault(_month(day), [0, 0])
+        month[1] += 1
+        if value:
+            completed += 1
+            month[0] += 1
+            run = run + 1 if last_completed == day - 1 else 1
+            longest = max(longest, run)
+            last_completed = day
+
+    streak = None
+    if last_completed is not None:
+        streak = {'habit_id': habit_id, 'current_streak': run, 'longest_streak': longest,
+                  'last_completed': last_completed}
+    rollups = [{'habit_id': habit_id, 'year': year, 'month': month, 'yes_count': yes, 'logged_count': count}
+               for (year, month), (yes, count) in months.items()]
+    stats = {
+        'habit_id': habit_id, 'first_day': first_day, 'last_day': last_day,
+        'logged_days': logged, 'completed_days': completed,
+        'completion_rate': round(completed / logged * 100, 2) if logged else None
+    }
+    return streak, rollups, stats
+
+def measurable_aggregates(measurable_id, rows):
+    # rows: (day, value) ordered by day. Zero and NULL values are logged but are not entries.
+    months = {}
+    logged = entries = 0
+    total = 0.0
+    minimum = maximum = None
+    first_day = last_day = None
+    for day, value in rows:
+        if first_day is None:
+            first_day = day
+        last_day = day
+        logged += 1
+        month = months.setdefault(_month(day), [0, 0.0, None, None])
+        if not value:
+            continue
+        entries += 1
+        total += value
+        minimum = value if minimum is None else min(minimum, value)
+        maximum = value if maximum is None else max(maximum, value)
+        month[0] += 1
+        month[1] += value
+        month[2] = value if month[2] is None else min(month[2], value)
+        month[3] = value if month[3] is None else max(month[3], value)
+
+    rollups = [{'measurable_id': measurable_id, 'year': year, 'month': month, 'entries': count, 'total': month_total,
+                'minimum': low, 'maximum': high}
+               for (year, month), (count, month_total, low, high) in months.items()]
+    stats = {
+        'measurable_id': measurable_id, 'first_day': first_day, 'last_day': last_day,
+        'logged_days': logged, 'entries': entries, 'total': total,
+        'average': round(total / entries, 2) if entries else None,
+        'minimum': minimum, 'maximum': maximum
+    }
+    return rollups, stats
+
+def run_shards(worker, user_shards, processes, initializer=None, initargs=(), progress=None):
+    # worker(user_ids) -> {counter: n}; runs inline when processes <= 1.
+    # progress(totals, elapsed) is called after every finished shard.
+    totals = {'users': 0}
+    started = time.perf_counter()
+
+    def finished(user_ids, counts):
+        totals['users'] += len(user_ids)
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+        if progress:
+            progress(totals, time.perf_counter() - started)
+
+    if processes <= 1:
+        if initializer:
+            initializer(*initargs)
+        for user_ids in user_shards:
+            finished(user_ids, worker(user_ids))
+        return totals, time.perf_counter() - started
+
+    # Spawned workers open their own connections instead of inheriting the parent's
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=initializer, initargs=initargs) as pool:
+        # Keep a couple of shards queued per worker rather than pickling them all up front
+        pending = {}
+        remaining = iter(user_shards)
+        for user_ids in remaining:
+            pending[pool.submit(worker, user_ids)] = user_ids
+            if len(pending) >= processes * 2:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished(pending.pop(future), future.result())
+                user_ids = next(remaining, None)
+                if user_ids is not None:
+                    pending[pool.submit(worker, user_ids)] = user_ids
+    return totals, time.perf_counter() - started
@@ -0,0 +1,70 @@
+import pytest
+
+import app as habits
+from models import db, Habit, Measurable, User
+
+# Every test gets a fresh in-memory database. The caches are module-level and
+# keyed by ids that repeat between databases, so they are emptied as well.
+TEST_CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'PASSWORD_HASH_BACKEND': 'inline',
+    'TESTING': True,
+}
+
+@pytest.fixture
+def app():
+    habits.habit_bitmaps.invalidate()
+    habits.definitions.invalidate()
+    habits.invalidate_badges()
+    with habits._seen_versions_lock:
+        habits._seen_versions.clear()
+    return habits.create_app(TEST_CONFIG)
+
+@pytest.fixture
+def make_user(app):
+    def make(username='tester'):
+        with app.app_context():
+            user = User(username=username, password='unused')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+@pytest.fixture
+def user_id(make_user):
+    return make_user()
+
+@pytest.fixture
+def make_client(app):
+    def make(user_id, username='tester'):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = username
+        return client
+    return make
+
+@pytest.fixture
+def client(make_client, user_id):
+    return make_client(user_id)
+
+@pytest.fixture
+def make_habit(app, user_id):
+    def make(name='Run', owner=None):
+        with app.app_context():
+            habit = Habit(user_id=owner or user_id, name=name, type='yesno', color='#60a5fa')
+            db.session.add(habit)
+            db.session.commit()
+            return habit.id
+    return make
+
+@pytest.fixture
+def make_measurable(app, user_id):
+    def make(name='Water', unit_target='8 glasses', target_type='Atleast', owner=None):
+        with app.app_context():
+            measurable = Measurable(user_id=owner or user_id, name=name, unit_target=unit_target,
+                                    target_type=target_type)
+            db.session.add(measurable)
+            db.session.commit()
+            return measurable.id
+    return make
@@ -0,0 +1,94 @@
+from datetime import date
+
+import app as habits
+from bitmap_cache import BitmapCache
+from models import db, Habit, User
+
+DAY = date(2024, 3, 10)
+
+def external_write(app, owner, statement, **params):
+    # What a write from another worker looks like to this process: the rows and
+    # data_version change without any of this process's caches being told
+    with app.app_context():
+        db.session.execute(db.text(statement), params)
+        db.session.execute(db.update(User).where(User.id == owner).values(data_version=User.data_version + 1))
+        db.session.commit()
+
+def test_etag_answers_304_until_the_data_changes(client, make_habit):
+    habit_id = make_habit()
+    url = f'/day_data/{DAY.isoformat()}'
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    cached = client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    client.post(f'/api/day/{DAY.isoformat()}', json={'habits': {str(habit_id): True}})
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.json['habit_logs'] == {str(habit_id): True}
+
+def test_etag_ignores_other_users_writes(client, make_user, make_client, make_habit):
+    other = make_user('other')
+    other_habit = make_habit(owner=other)
+    url = f'/day_data/{DAY.isoformat()}'
+    etag = client.get(url).headers['ETag']
+
+    response = make_client(other, 'other').post(f'/api/day/{DAY.isoformat()}', json={'habits': {str(other_habit): True}})
+    assert response.status_code == 200
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+def test_writes_from_another_worker_reach_the_caches(app, client, user_id, make_habit):
+    habit_id = make_habit()
+    url = f'/day_data/{DAY.isoformat()}'
+    client.post(f'/api/day/{DAY.isoformat()}', json={'habits': {str(habit_id): True}})
+    assert client.get(url).json['habit_logs'] == {str(habit_id): True}
+    month = client.get(f'/?year={DAY.year}&month={DAY.month}')
+    assert month.status_code == 200
+
+    external_write(app, user_id, "UPDATE habit_log SET value = 0 WHERE habit_id = :habit_id", habit_id=habit_id)
+    assert client.get(url).json['habit_logs'] == {str(habit_id): False}
+
+    # A habit created elsewhere is known to the definition cache and /api/day
+    external_write(app, user_id, "INSERT INTO habit (user_id, name, type) VALUES (:user_id, 'Read', 'yesno')",
+                   user_id=user_id)
+    with app.app_context():
+        new_id = db.session.execute(db.select(Habit.id).where(Habit.name == 'Read')).scalar()
+    assert [h['name'] for h in client.get(url).json['habits']] == ['Run', 'Read']
+    response = client.post(f'/api/day/{DAY.isoformat()}', json={'habits': {str(new_id): True}})
+    assert response.status_code == 200
+
+def test_local_writes_keep_the_caches_warm(app, client, make_habit):
+    habit_id = make_habit()
+    client.post(f'/api/day/{DAY.isoformat()}', json={'habits': {str(habit_id): True}})
+    client.get(f'/day_data/{DAY.isoformat()}')
+    before = habits.habit_bitmaps.stats()
+
+    client.post(f'/api/day/{DAY.isoformat()}', json={'habits': {str(habit_id): False}})
+    assert client.get(f'/day_data/{DAY.isoformat()}').json['habit_logs'] == {str(habit_id): False}
+    after = habits.habit_bitmaps.stats()
+    assert after['misses'] == before['misses']
+    assert after['hits'] > before['hits']
+
+def test_bitmap_cache_write_through_and_invalidation():
+    calls = []
+
+    def loader(habit_ids, year):
+        calls.append((tuple(habit_ids), year))
+        return {1: [(DAY.toordinal(), True)], 2: [(DAY.toordinal(), False)]}
+
+    cache = BitmapCache(loader)
+    day = DAY.toordinal()
+    assert cache.day_values([1, 2], day) == {1: True, 2: False}
+    cache.set_day(2, day, True)
+    cache.set_day(1, day + 1, True)
+    assert cache.day_values([1, 2], day) == {1: True, 2: True}
+    assert cache.range_rows(1, day, day + 1) == [(day, True), (day + 1, True)]
+    assert len(calls) == 1
+
+    cache.invalidate_many([2])
+    assert cache.day_values([1, 2], day) == {1: True, 2: False}
+    assert calls[-1] == ((2,), DAY.year)
@@ -0,0 +1,79 @@
+import json
+import re
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import analytics
+import app as habits
+import models
+from models import db
+
+def chart(client, measurable_id, query):
+    response = client.get(f'/measurable_visual/{measurable_id}?{query}')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    labels = json.loads(re.search(r'labels: (\[.*?\]),', page).group(1))
+    datasets = [json.loads(data) for data in re.findall(r'data: (\[.*?\]),', page)]
+    return labels, datasets, page
+
+def add_logs(app, measurable_id, start, values):
+    with app.app_context():
+        habits.upsert_measurable_logs([
+            {'measurable_id': measurable_id, 'date': (start + timedelta(days=i)).isoformat(),
+             'day': start.toordinal() + i, 'value': value}
+            for i, value in enumerate(values)
+        ])
+        habits.rebuild_rollups(measurable_ids=[measurable_id])
+        db.session.commit()
+
+def test_lttb_keeps_the_ends_and_the_shape():
+    x = np.arange(5000)
+    y = np.sin(x / 200.0)
+    y[1234] = 50  # a spike has the largest triangle in its bucket
+    picked = analytics.lttb(x, y, 300)
+    assert picked.size == 300
+    assert picked[0] == 0 and picked[-1] == x.size - 1
+    assert np.all(np.diff(picked) > 0)
+    assert 1234 in picked
+
+def test_lttb_leaves_short_series_alone():
+    assert analytics.lttb(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+    assert analytics.lttb(np.arange(10), np.arange(10), 2).tolist() == list(range(10))
+
+def test_chart_points_only_keeps_logged_days():
+    values = np.full(3000, np.nan)
+    values[::2] = np.arange(1500)
+    assert analytics.chart_points(values[:100], 1000).tolist() == list(range(100))
+    picked = analytics.chart_points(values, 1000)
+    assert picked.size == 1000
+    assert not np.isnan(values[picked]).any()
+
+@pytest.mark.parametrize('query, points', [
+    ('start=2020-01-01&end=2025-06-30', habits.CHART_MAX_POINTS),  # 2008 days, downsampled
+    ('start=2024-01-01&end=2024-03-31', 91),                       # short ranges keep every day
+])
+def test_measurable_chart_point_count(app, client, make_measurable, query, points):
+    measurable_id = make_measurable()
+    rng = np.random.default_rng(3)
+    add_logs(app, measurable_id, date(2020, 1, 1), rng.integers(1, 12, 2008).tolist())
+
+    labels, (values, rolling7, rolling30), _ = chart(client, measurable_id, query)
+    assert len(labels) == len(values) == len(rolling7) == len(rolling30) == points
+
+def test_year_view_reads_the_monthly_rollups(app, client, make_measurable, monkeypatch):
+    measurable_id = make_measurable()
+    year = date.today().year
+    add_logs(app, measurable_id, date(year, 1, 30), [4, 6, 0, 10])  # Jan 30 - Feb 2
+
+    def no_daily_reads(*args, **kwargs):
+        raise AssertionError('the year view must not read daily logs')
+    monkeypatch.setattr(models, 'measurable_log_rows', no_daily_reads)
+
+    labels, datasets, page = chart(client, measurable_id, 'view=year')
+    assert len(labels) == 12
+    assert datasets == [[10.0, 10.0] + [0] * 10]
+    # Average per entry (20 over 3 entries), zero days left out like the daily views
+    assert re.findall(r'font-bold text-\w+-600">([^<]*)<', page)[:3] == ['6.67', '10.0', '4.0']
+    assert 'Percentiles' not in page
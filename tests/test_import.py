@@ -0,0 +1,126 @@
+import io
+import json
+
+import pytest
+
+import models
+from models import db, Habit, HabitLog, Journal, Measurable, MeasurableLog
+
+def upload(client, content, filename, **form):
+    data = {'file': (io.BytesIO(content.encode('utf-8')), filename), **form}
+    return client.post('/api/import', data=data, content_type='multipart/form-data')
+
+def snapshot(app, user_id):
+    # Everything an import restores, keyed by names and dates rather than ids
+    with app.app_context():
+        habit_logs = db.session.execute(
+            db.select(Habit.name, HabitLog.date, HabitLog.value).join(Habit).where(Habit.user_id == user_id)
+        ).all()
+        measurable_logs = db.session.execute(
+            db.select(Measurable.name, MeasurableLog.date, MeasurableLog.value).join(Measurable)
+            .where(Measurable.user_id == user_id)
+        ).all()
+        journals = db.session.execute(db.select(Journal.date, Journal.content).where(Journal.user_id == user_id)).all()
+        definitions = db.session.execute(
+            db.select(Habit.name, Habit.color).where(Habit.user_id == user_id)
+        ).all() + db.session.execute(
+            db.select(Measurable.name, Measurable.unit_target, Measurable.target_type).where(Measurable.user_id == user_id)
+        ).all()
+        streaks = {name: (streak.current_streak, streak.longest_streak) for name, habit_id in db.session.execute(
+            db.select(Habit.name, Habit.id).where(Habit.user_id == user_id)
+        ) if (streak := models.habit_streak(habit_id)) is not None}
+    return {'definitions': sorted(definitions), 'habit_logs': sorted(habit_logs),
+            'measurable_logs': sorted(measurable_logs), 'journals': sorted(journals), 'streaks': streaks}
+
+@pytest.fixture
+def source(app, client, make_habit, make_measurable):
+    run = make_habit('Run')
+    make_habit('Stretch')
+    water = make_measurable('Water')
+    for day, done, glasses in [('2024-01-01', True, 6), ('2024-01-02', True, 9), ('2024-01-03', False, 0),
+                               ('2024-01-04', True, 8.5)]:
+        client.post(f'/api/day/{day}', json={'habits': {str(run): done}, 'measurables': {str(water): glasses}})
+    client.post('/journal/2024-01-02', data={'content': 'Long run, "quotes" and ünïcode\nsecond line'})
+    return client
+
+@pytest.fixture
+def target(make_user, make_client):
+    user_id = make_user('restored')
+    return user_id, make_client(user_id, 'restored')
+
+@pytest.mark.parametrize('query, filename', [('', 'export.json'), ('?format=ndjson', 'export.ndjson'),
+                                             ('?stream=1', 'export.json')])
+def test_export_import_round_trip(app, user_id, source, target, query, filename):
+    exported = source.get(f'/api/export/json{query}').get_data(as_text=True)
+    target_id, target_client = target
+
+    response = upload(target_client, exported, filename)
+    assert response.status_code == 200
+    summary = response.json
+    assert 'errors' not in summary['counts']
+    assert summary['counts']['habits_created'] == 2
+    assert summary['counts']['habit_logs'] == 4
+    assert snapshot(app, target_id) == snapshot(app, user_id)
+
+def test_importing_twice_matches_definitions_and_upserts_logs(app, source, target):
+    exported = source.get('/api/export/json').get_data(as_text=True)
+    target_id, target_client = target
+    upload(target_client, exported, 'export.json')
+    first = snapshot(app, target_id)
+
+    summary = upload(target_client, exported, 'export.json').json
+    assert summary['counts']['habits_matched'] == 2
+    assert 'habits_created' not in summary['counts']
+    assert snapshot(app, target_id) == first
+
+def test_dry_run_writes_nothing(app, source, target):
+    exported = source.get('/api/export/json').get_data(as_text=True)
+    target_id, target_client = target
+    summary = upload(target_client, exported, 'export.json', dry_run='1').json
+    assert summary['dry_run'] is True
+    assert summary['counts']['habit_logs'] == 4
+    assert snapshot(app, target_id) == {'definitions': [], 'habit_logs': [], 'measurable_logs': [],
+                                        'journals': [], 'streaks': {}}
+
+def test_malformed_records_are_counted_and_skipped(app, client, user_id):
+    lines = [
+        'not json',
+        json.dumps({'name': 'no kind'}),
+        json.dumps({'kind': 'habit', 'id': 1, 'name': 'Bad type', 'type': {'a': 1}}),
+        json.dumps({'kind': 'measurable', 'id': 2, 'name': ['list']}),
+        json.dumps({'kind': 'habit', 'id': 3, 'name': ''}),
+        json.dumps({'kind': 'habit', 'id': 4, 'name': 'Good', 'color': '#123456'}),
+        json.dumps({'kind': 'habit_log', 'habit_id': 4, 'date': '2024-02-30', 'value': True}),
+        json.dumps({'kind': 'habit_log', 'habit_id': 99, 'date': '2024-02-01', 'value': True}),
+        json.dumps({'kind': 'habit_log', 'habit_id': 4, 'date': '2024-02-01', 'value': True}),
+        json.dumps({'kind': 'journal', 'date': '2024-02-01', 'content': {'nested': True}}),
+        json.dumps({'kind': 'journal', 'date': '2024-02-01', 'content': 'fine'}),
+    ]
+    response = upload(client, '\n'.join(lines), 'broken.ndjson')
+    assert response.status_code == 200
+    summary = response.json
+    assert summary['counts']['errors'] == 8
+    assert len(summary['errors']) == 8
+    assert summary['counts']['habits_created'] == 1
+    assert summary['counts']['habit_logs'] == 1
+    assert summary['counts']['journals'] == 1
+
+    data = snapshot(app, user_id)
+    assert data['definitions'] == [('Good', '#123456')]
+    assert data['habit_logs'] == [('Good', '2024-02-01', True)]
+    assert data['journals'] == [('2024-02-01', 'fine')]
+
+def test_unreadable_json_document_is_rejected(client):
+    response = upload(client, '{"habits": [', 'export.json')
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Import failed')
+
+def test_loop_csv(app, client, user_id):
+    content = 'Date,Run,Read\n2024-03-01,2,0\n2024-03-02,YES,-1\n2024-03-03,0,maybe\n'
+    summary = upload(client, content, 'Checkmarks.csv').json
+    assert summary['counts']['habits_created'] == 2
+    assert summary['counts']['errors'] == 1
+    assert snapshot(app, user_id)['habit_logs'] == [
+        ('Read', '2024-03-01', False),
+        ('Run', '2024-03-01', True), ('Run', '2024-03-02', True), ('Run', '2024-03-03', False),
+    ]
@@ -0,0 +1,95 @@
+import pytest
+
+import app as habits
+
+@pytest.fixture(params=['fts5', 'like'])
+def app(request, app, monkeypatch):
+    # 'like' is a SQLite build without FTS5: the virtual table cannot be created
+    if request.param == 'fts5':
+        return app
+    monkeypatch.setattr(habits, 'JOURNAL_FTS_SQL', ['CREATE VIRTUAL TABLE journal_fts USING no_such_module(content)'])
+    return habits.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'PASSWORD_HASH_BACKEND': 'inline',
+                              'TESTING': True})
+
+def write(client, day, content):
+    assert client.post(f'/journal/{day}', data={'content': content}).status_code == 200
+
+def search(client, query, **params):
+    response = client.get('/journals/search', query_string={'q': query, **params})
+    assert response.status_code == 200
+    return response.json
+
+def test_search_mode_follows_the_database(app, request):
+    with app.app_context():
+        assert habits.journal_search_available() is (request.node.callspec.params['app'] == 'fts5')
+
+def test_finds_matching_entries(client):
+    write(client, '2024-05-01', 'Morning run by the river')
+    write(client, '2024-05-02', 'Evening reading')
+    assert [r['date'] for r in search(client, 'river')['results']] == ['2024-05-01']
+    assert [r['date'] for r in search(client, 'riv')['results']] == ['2024-05-01']
+    assert search(client, 'swimming')['results'] == []
+    assert search(client, '   ')['results'] == []
+
+def test_snippets_are_escaped(client):
+    write(client, '2024-05-01', '<script>alert(1)</script> by the river & lake')
+    snippet = search(client, 'river')['results'][0]['snippet']
+    assert '<script>' not in snippet
+    assert '&lt;script&gt;' in snippet
+    assert '&amp;' in snippet
+
+def test_other_users_entries_are_not_found(client, make_user, make_client):
+    other = make_client(make_user('other'), 'other')
+    write(other, '2024-05-01', 'river')
+    assert search(client, 'river')['results'] == []
+    assert len(search(other, 'river')['results']) == 1
+
+@pytest.mark.parametrize('app', ['fts5'], indirect=True)
+def test_fts5_ranks_and_highlights(client):
+    write(client, '2024-05-01', 'A long day. Work, errands, cooking, and a short walk along the river at night.')
+    write(client, '2024-05-02', 'River, river, river: kayaking all day on the river')
+    write(client, '2024-05-03', 'Quiet day at home')
+    results = search(client, 'river')['results']
+    assert [r['date'] for r in results] == ['2024-05-02', '2024-05-01']
+    assert results[0]['rank'] <= results[1]['rank']
+    assert '<mark>river</mark>' in results[1]['snippet']
+    # Every word has to match
+    assert [r['date'] for r in search(client, 'walk river')['results']] == ['2024-05-01']
+
+@pytest.mark.parametrize('app', ['fts5'], indirect=True)
+def test_fts5_pages(client):
+    for day in range(1, 6):
+        write(client, f'2024-05-0{day}', f'river entry {day}')
+    first = search(client, 'river', per_page=3)
+    second = search(client, 'river', per_page=3, page=2)
+    assert (len(first['results']), first['has_more']) == (3, True)
+    assert (len(second['results']), second['has_more']) == (2, False)
+
+@pytest.mark.parametrize('app', ['like'], indirect=True)
+def test_like_fallback_takes_wildcards_literally(client):
+    write(client, '2024-05-01', '100% done')
+    write(client, '2024-05-02', r'a_b path C:\x')
+    write(client, '2024-05-03', 'plain text')
+    for query, expected in [('%', ['2024-05-01']), ('_', ['2024-05-02']), ('\\', ['2024-05-02']),
+                            ('100%', ['2024-05-01']), ('text', ['2024-05-03'])]:
+        assert [r['date'] for r in search(client, query)['results']] == expected
+
+@pytest.mark.parametrize('app', ['fts5'], indirect=True)
+def test_each_app_gets_its_own_index(app, client, make_client):
+    write(client, '2024-05-01', 'river')
+    assert len(search(client, 'river')['results']) == 1
+
+    # A second app on a new database must create journal_fts there too
+    other_app = habits.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'PASSWORD_HASH_BACKEND': 'inline',
+                                   'TESTING': True})
+    with other_app.app_context():
+        user = habits.User(username='second', password='unused')
+        habits.db.session.add(user)
+        habits.db.session.commit()
+        user_id = user.id
+    other = other_app.test_client()
+    with other.session_transaction() as session:
+        session['user_id'] = user_id
+    write(other, '2024-05-01', 'lake')
+    assert [r['date'] for r in search(other, 'lake')['results']] == ['2024-05-01']
+    assert other_app.extensions['journal_search'] is True
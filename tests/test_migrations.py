@@ -0,0 +1,66 @@
+import sqlite3
+from datetime import date
+
+import app as habits
+import models
+from models import db, HabitLog, Journal, MeasurableLog
+
+# The schema as the original release created it, before any migration
+LEGACY_SCHEMA = [
+    "CREATE TABLE user (id INTEGER NOT NULL, username VARCHAR(150) NOT NULL, password VARCHAR(200) NOT NULL, "
+    "PRIMARY KEY (id), UNIQUE (username))",
+    "CREATE TABLE habit (id INTEGER NOT NULL, user_id INTEGER NOT NULL, type VARCHAR(50) NOT NULL, "
+    "name VARCHAR(150) NOT NULL, question TEXT, notes TEXT, color VARCHAR(20), PRIMARY KEY (id))",
+    "CREATE TABLE measurable (id INTEGER NOT NULL, user_id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, "
+    "question VARCHAR(255), unit_target VARCHAR(50) NOT NULL, target_type VARCHAR(20) NOT NULL, notes TEXT, "
+    "color VARCHAR(20), PRIMARY KEY (id))",
+    "CREATE TABLE habit_log (id INTEGER NOT NULL, habit_id INTEGER NOT NULL, date VARCHAR(10) NOT NULL, "
+    "value BOOLEAN, PRIMARY KEY (id))",
+    "CREATE TABLE measurable_log (id INTEGER NOT NULL, measurable_id INTEGER NOT NULL, "
+    "date VARCHAR(10) NOT NULL, value FLOAT, PRIMARY KEY (id))",
+    "CREATE TABLE journal (id INTEGER NOT NULL, user_id INTEGER NOT NULL, date VARCHAR(10) NOT NULL, "
+    "content TEXT, PRIMARY KEY (id))",
+]
+
+LEGACY_ROWS = [
+    "INSERT INTO user VALUES (1, 'legacy', 'unused')",
+    "INSERT INTO habit VALUES (1, 1, 'yesno', 'Run', NULL, NULL, NULL)",
+    "INSERT INTO measurable VALUES (1, 1, 'Water', NULL, '8', 'Atleast', NULL, NULL)",
+    # '2025-7-4' and '2025-07-04' are the same day; the newer row (id 2) wins
+    "INSERT INTO habit_log VALUES (1, 1, '2025-07-04', 0)",
+    "INSERT INTO habit_log VALUES (2, 1, '2025-7-4', 1)",
+    "INSERT INTO habit_log VALUES (3, 1, '2025-07-05', 1)",
+    "INSERT INTO measurable_log VALUES (1, 1, '2025-07-04', 3)",
+    "INSERT INTO measurable_log VALUES (2, 1, 'yesterday', 5)",
+    "INSERT INTO journal VALUES (1, 1, '2025-7-4', 'legacy entry')",
+]
+
+def legacy_database(path):
+    connection = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA + LEGACY_ROWS:
+        connection.execute(statement)
+    connection.commit()
+    connection.close()
+
+def test_migrating_a_legacy_database_with_malformed_dates(tmp_path):
+    path = tmp_path / 'legacy.db'
+    legacy_database(path)
+    app = habits.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'PASSWORD_HASH_BACKEND': 'inline'})
+
+    july_4 = date(2025, 7, 4).toordinal()
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA user_version')).scalar() == len(habits.MIGRATIONS)
+        habit_logs = db.session.execute(db.select(HabitLog.id, HabitLog.date, HabitLog.day, HabitLog.value)
+                                        .order_by(HabitLog.day)).all()
+        assert habit_logs == [(2, '2025-07-04', july_4, True), (3, '2025-07-05', july_4 + 1, True)]
+        assert db.session.execute(db.select(Journal.date, Journal.day)).all() == [('2025-07-04', july_4)]
+        assert db.session.execute(db.select(MeasurableLog.date, MeasurableLog.value)).all() == [('2025-07-04', 3.0)]
+        quarantined = db.session.execute(db.text('SELECT source, row_id, reason FROM quarantined_rows')).all()
+        assert quarantined == [('measurable_log', 2, 'unreadable date')]
+        streak = models.habit_streak(1)
+        assert (streak.current_streak, streak.longest_streak) == (2, 2)
+
+    # Migrations are recorded, so a second app on the same file starts without redoing them
+    app = habits.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'PASSWORD_HASH_BACKEND': 'inline'})
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(HabitLog.id))).scalar() == 2
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db, User
+from password_hasher import HasherBusy, PasswordHasher
+
+def stored_password(app, username):
+    with app.app_context():
+        return db.session.execute(db.select(User.password).filter_by(username=username)).scalar_one()
+
+def test_login_rehashes_passwords_made_with_old_parameters(app):
+    with app.app_context():
+        db.session.add(User(username='old', password=generate_password_hash('secret', 'pbkdf2:sha256:1000')))
+        db.session.commit()
+    client = app.test_client()
+
+    assert client.post('/login', data={'username': 'old', 'password': 'wrong'}).headers['Location'] == '/login'
+    assert stored_password(app, 'old').startswith('pbkdf2:sha256:1000$')
+
+    response = client.post('/login', data={'username': 'old', 'password': 'secret'})
+    assert response.headers['Location'] == '/'
+    stored = stored_password(app, 'old')
+    assert stored.startswith('scrypt:')
+    assert check_password_hash(stored, 'secret')
+
+    app.test_client().post('/login', data={'username': 'old', 'password': 'secret'})
+    assert stored_password(app, 'old') == stored
+    assert app.extensions['password_hasher'].stats()['rehashed'] == 1
+
+def test_busy_hasher_answers_503(app, monkeypatch):
+    hasher = app.extensions['password_hasher']
+    monkeypatch.setattr(hasher, 'slots', type(hasher.slots)(1))
+    monkeypatch.setattr(hasher, 'queue_timeout', 0)
+    hasher.slots.acquire()
+    client = app.test_client()
+
+    response = client.post('/register', data={'username': 'new', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert b'Too many sign-ups' in response.data
+    with app.app_context():
+        assert db.session.execute(db.select(User).filter_by(username='new')).first() is None
+
+    with app.app_context():
+        db.session.add(User(username='known', password=generate_password_hash('secret')))
+        db.session.commit()
+    response = client.post('/login', data={'username': 'known', 'password': 'secret'})
+    assert response.status_code == 503
+    assert b'Too many sign-ins' in response.data
+    with client.session_transaction() as session:
+        assert 'user_id' not in session
+    assert hasher.stats()['rejected'] == 2
+
+    hasher.slots.release()
+    assert client.post('/login', data={'username': 'known', 'password': 'secret'}).headers['Location'] == '/'
+
+def test_busy_hasher_raises_after_the_queue_timeout():
+    hasher = PasswordHasher(backend='inline', max_pending=1, queue_timeout=0.01)
+    hasher.slots.acquire()
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret')
+    assert hasher.stats()['hash']['count'] == 0
+
+EXIT_SCRIPT = """
+from password_hasher import PasswordHasher
+
+if __name__ == '__main__':
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1)
+    print(hasher.check(hasher.hash('secret'), 'secret'))
+"""
+
+def test_process_pool_is_shut_down_at_exit(tmp_path):
+    script = tmp_path / 'exit_with_pool.py'
+    script.write_text(EXIT_SCRIPT)
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=60,
+                            env={**os.environ, 'PYTHONPATH': str(Path(__file__).parent.parent)})
+    assert result.stdout.strip() == 'True'
+    assert result.stderr == ''
+
+def test_shutdown_releases_the_pool():
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1)
+    assert hasher.check(hasher.hash('secret'), 'secret')
+    hasher.shutdown()
+    assert hasher.pool is None
+    hasher.shutdown()
@@ -0,0 +1,72 @@
+import random
+from datetime import date, timedelta
+
+import app as habits
+import models
+import stats_job
+from models import db
+
+START = date(2024, 1, 1)
+
+def set_day(client, habit_id, day, value, use_form=False):
+    if use_form:
+        response = client.post('/update_habit', data={'habit_id': habit_id, 'date': day.isoformat(),
+                                                      'value': 'true' if value else 'false'})
+    else:
+        response = client.post(f'/api/day/{day.isoformat()}', json={'habits': {str(habit_id): value}})
+    assert response.status_code == 200
+
+def incremental_and_recomputed(app, habit_id):
+    with app.app_context():
+        stored = models.habit_streak(habit_id)
+        habits.recompute_streaks([habit_id])
+        recomputed = models.habit_streak(habit_id)
+        db.session.rollback()
+    return stored, recomputed
+
+def test_incremental_streaks_match_full_recompute(app, client, make_habit):
+    habit_id = make_habit()
+    rng = random.Random(7)
+    # Mostly appends in order, with edits in the past and overwrites mixed in
+    days = [START + timedelta(days=i) for i in range(60)]
+    writes = [(day, rng.random() < 0.7) for day in days]
+    writes += [(rng.choice(days), rng.random() < 0.5) for _ in range(40)]
+    for i, (day, value) in enumerate(writes):
+        set_day(client, habit_id, day, value, use_form=i % 3 == 0)
+        stored, recomputed = incremental_and_recomputed(app, habit_id)
+        assert stored == recomputed, f'after write {i}: {day} = {value}'
+
+def test_streaks_match_the_stats_job(app, client, make_habit):
+    habit_id = make_habit()
+    rng = random.Random(11)
+    for offset in rng.sample(range(90), 90):
+        set_day(client, habit_id, START + timedelta(days=offset), rng.random() < 0.8)
+
+    with app.app_context():
+        stored = models.habit_streak(habit_id)
+        rows = [(row.day, row.value) for row in models.habit_log_rows(habit_id, 0, date.max.toordinal())]
+    streak, _, _ = stats_job.habit_aggregates(habit_id, rows)
+    assert (stored.current_streak, stored.longest_streak, stored.last_completed) == (
+        streak['current_streak'], streak['longest_streak'], streak['last_completed'])
+
+def test_unmarking_the_last_day_shortens_the_streak(app, client, make_habit):
+    habit_id = make_habit()
+    for offset in range(5):
+        set_day(client, habit_id, START + timedelta(days=offset), True)
+    set_day(client, habit_id, START + timedelta(days=4), False)
+
+    stored, recomputed = incremental_and_recomputed(app, habit_id)
+    assert stored == recomputed
+    assert (stored.current_streak, stored.longest_streak) == (4, 4)
+    assert stored.last_completed == (START + timedelta(days=3)).toordinal()
+
+def test_current_streak_ends_after_a_missed_day(app, client, make_habit):
+    habit_id = make_habit()
+    for offset in range(3):
+        set_day(client, habit_id, START + timedelta(days=offset), True)
+
+    last = START + timedelta(days=2)
+    with app.app_context():
+        assert habits.streak_summary(habit_id, today=last + timedelta(days=1))['current'] == 3
+        summary = habits.streak_summary(habit_id, today=last + timedelta(days=2))
+    assert summary == {'current': 0, 'longest': 3, 'last_completed': last.isoformat()}
@@ -0,0 +1,53 @@
+import pytest
+
+from models import db, HabitLog, MeasurableLog, User
+
+def data_version(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).data_version
+
+@pytest.mark.parametrize('url, field', [('/update_habit', 'habit_id'), ('/update_measurable', 'measurable_id')])
+def test_single_value_routes_check_the_owner(app, client, make_user, make_client, make_habit, make_measurable,
+                                              url, field):
+    other = make_user('other')
+    owned = {'habit_id': make_habit(owner=other), 'measurable_id': make_measurable(owner=other)}[field]
+    form = {field: owned, 'date': '2024-05-01', 'value': 'true' if field == 'habit_id' else '3'}
+    version = data_version(app, other)
+
+    assert app.test_client().post(url, data=form).status_code == 401
+    assert client.post(url, data=form).status_code == 404
+    assert client.post(url, data={**form, field: 'abc'}).status_code == 400
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(HabitLog.id))).scalar() == 0
+        assert db.session.execute(db.select(db.func.count(MeasurableLog.id))).scalar() == 0
+    assert data_version(app, other) == version
+
+    assert make_client(other, 'other').post(url, data=form).status_code == 200
+    assert data_version(app, other) == version + 1
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', 'NaN', 'abc', [1]])
+def test_day_save_rejects_non_finite_and_non_numeric_values(app, client, make_measurable, value):
+    measurable_id = make_measurable()
+    response = client.post('/api/day/2024-05-01', json={'measurables': {str(measurable_id): value}})
+    assert response.status_code == 400
+    assert client.post('/update_measurable', data={'measurable_id': measurable_id, 'date': '2024-05-01',
+                                                   'value': str(value)}).status_code == 400
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(MeasurableLog.id))).scalar() == 0
+
+@pytest.mark.parametrize('value', ['false', '0', 0, 1, None])
+def test_day_save_only_takes_json_booleans_for_habits(app, client, make_habit, value):
+    habit_id = make_habit()
+    response = client.post('/api/day/2024-05-01', json={'habits': {str(habit_id): value}})
+    assert response.status_code == 400
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(HabitLog.id))).scalar() == 0
+
+def test_day_save_writes_the_whole_day(app, client, make_habit, make_measurable):
+    habit_id, measurable_id = make_habit(), make_measurable()
+    response = client.post('/api/day/2024-05-01', json={'habits': {str(habit_id): True},
+                                                        'measurables': {str(measurable_id): '2.5'}})
+    assert response.json == {'status': 'ok', 'habits': 1, 'measurables': 1}
+    day = client.get('/day_data/2024-05-01').json
+    assert day['habit_logs'] == {str(habit_id): True}
+    assert day['measurable_logs'] == {str(measurable_id): 2.5}